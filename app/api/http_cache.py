@@ -0,0 +1,127 @@
+"""
+Client-facing HTTP caching (ETag / If-None-Match), range and response compression helpers.
+"""
+import gzip
+import hashlib
+from typing import Iterable
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# Preferred first when the client accepts several equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Fast settings: these run on the request path, per response
+_GZIP_LEVEL = 5
+_BROTLI_QUALITY = 4
+
+
+def strong_etag(parts: Iterable[str | int | None]) -> str:
+    """
+    Strong ETag over the values a response body is rendered from, so it can be
+    checked before (or instead of) rendering the body.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        # Separator plus a distinct marker for None, so ("a", None) != ("aNone",)
+        digest.update(b"\x00" if part is None else str(part).encode() + b"\x1f")
+    return f'"{digest.hexdigest()}"'
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    ETag of the `encoding`-compressed representation; a strong ETag names exact bytes.
+    """
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against `etag`, as RFC 9110 requires
+    for conditional GETs. Tags of compressed representations match their source.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        for encoding in ENCODINGS:
+            suffix = f'-{encoding}"'
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+                break
+        if tag == etag:
+            return True
+    return False
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """
+    Best supported content coding allowed by an Accept-Encoding header, or None for identity.
+    """
+    if not accept_encoding:
+        return None
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        qualities[coding.strip().lower()] = q
+    wildcard = qualities.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = qualities.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def byte_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    First and last byte (inclusive) of a single-range `Range: bytes=...` header within a
+    body of `size` bytes, or None to send the whole body: no header, several ranges,
+    another unit or a malformed value, which RFC 9110 lets a server ignore.
+    Raises RangeNotSatisfiable when the range lies outside the body.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not dash or "," in spec:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if not last.isdigit():
+            return None
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable(range_header)
+        return max(0, size - int(last)), size - 1
+    if not first.isdigit() or (last and not last.isdigit()):
+        return None
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(range_header)
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=_BROTLI_QUALITY)
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and so its ETag, deterministic
+        return gzip.compress(body, compresslevel=_GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported content coding '{encoding}'")
@@ -1,91 +1,284 @@
-from fastapi import APIRouter, HTTPException, Path, Response
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.api.http_cache import (
+    RangeNotSatisfiable, byte_range, compress, encoded_etag, etag_matches, negotiate_encoding, strong_etag,
+)
+from app.config import Settings, get_settings
+from app.dependencies import get_file_service, get_gist_service
 from app.schemas.common import GitHubUsername
-import requests
-from fastapi_pagination import Page, paginate
-from pydantic import BaseModel
+from app.schemas.gists import GIST_SUMMARIES, GIST_SUMMARY, BatchRequest, BatchResponse, BatchResult, GistSummary
+from app.services.files import GistFileService
+from app.services.gists import GistService, gather_limited
+from app.services.metrics import GIST_FILE_RESPONSES, PAGINATION_SIZE, TimedRoute, record_stage
+from app.services.search import SortField
+from fastapi_pagination import Page, Params, resolve_params
+import asyncio
+import httpx
 import logging
-import os
+from math import ceil
+import time
+from typing import Annotated
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 logger = logging.getLogger("uvicorn.error")
 
-class GistSummary(BaseModel):
-    id: str
-    html_url: str
-    description: str | None
-
 # Add this endpoint BEFORE your /users/{username} endpoint
 @router.get("/favicon.ico", include_in_schema=False)
 async def favicon():
     return Response(status_code=204)
 
+def _page_json(items: list[GistSummary], total: int, params: Params) -> bytes:
+    """
+    The JSON of Page[GistSummary] (items, total, page, size, pages), rendered in one pass.
+    Items are already-validated summaries, so they are not validated again.
+    """
+    items_json = GIST_SUMMARIES.dump_json(items)
+    return b'{"items":%s,"total":%d,"page":%d,"size":%d,"pages":%d}' % (
+        items_json, total, params.page, params.size, ceil(total / params.size)
+    )
+
+def _page_etag(items: list[GistSummary], total: int, params: Params) -> str:
+    """
+    Strong ETag of the page _page_json would render, computed without rendering it.
+    """
+    fields = (value for gist in items for value in (gist.id, gist.html_url, gist.description))
+    return strong_etag((total, params.page, params.size, *fields))
+
 @router.get("/{username}", response_model=Page[GistSummary])
 async def get_gists(
+    request: Request,
     username: str = Path(
     ..., 
     min_length=1,
     max_length=39,
     pattern=r"^[a-zA-Z0-9]+(-[a-zA-Z0-9]+)*$",
     description="""GitHub username (1-39 characters, alphanumeric and hyphen, cannot start/end with hyphen)
-    disallowing '-octocat', 'octocat-,octo--cat', '--octocat', 'octocat--cat','octocat-octo-cat', 'octocat-octo-cat-'""" )
+    disallowing '-octocat', 'octocat-,octo--cat', '--octocat', 'octocat--cat','octocat-octo-cat', 'octocat-octo-cat-'""" ),
+    q: str | None = Query(None, max_length=200, description="Words that must all appear in the description or a filename"),
+    language: str | None = Query(None, max_length=50, description="Only gists with a file in this language"),
+    public: bool | None = Query(None, description="Only public (true) or secret (false) gists"),
+    sort: SortField | None = Query(None, description="Newest first by this date, instead of GitHub's order"),
+    service: GistService = Depends(get_gist_service),
+    settings: Settings = Depends(get_settings),
     ):
     """
     Fetch the public gists for a given GitHub username and return a simplified list.
     Username must match GitHub's allowed characters.
+    Only the GitHub pages covering the requested page/size are fetched, and
+    results are served from the in-process cache when available.
+    With q, language, public or sort, every page of the user is loaded (through
+    the cache) and the filters run on an in-memory index; page/size then apply
+    to the matching gists.
+    Responses carry an ETag (If-None-Match is answered with 304) and are
+    compressed when the client accepts it.
+    """
+    params = resolve_params()
+    raw_params = params.to_raw_params()
+    PAGINATION_SIZE.observe(raw_params.limit)
+    if q or language or public is not None or sort:
+        matches, count = await service.search(username, q, language, public, sort)
+        items, total = matches[raw_params.offset:raw_params.offset + raw_params.limit], len(matches)
+    else:
+        items, total = await service.get_window(username, raw_params.offset, raw_params.limit)
+        count = total
+
+    if not count:
+        logger.info(f"User '{username}' has no gists or doesn't exist.")
+        raise HTTPException(status_code=404, detail=f"No gists found for GitHub user '{username}'.")
+
+    headers = {
+        "ETag": _page_etag(items, total, params),
+        "Cache-Control": f"public, max-age={settings.http_max_age}, "
+                         f"stale-while-revalidate={settings.http_stale_while_revalidate}",
+        "Vary": "Accept-Encoding",
+    }
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+    if_none_match = request.headers.get("If-None-Match")
+    if etag_matches(if_none_match, headers["ETag"]):
+        # A client holding the compressed variant gets that variant's tag back
+        if encoding and encoded_etag(headers["ETag"], encoding) in if_none_match:
+            headers["ETag"] = encoded_etag(headers["ETag"], encoding)
+        return Response(status_code=304, headers=headers)
+
+    # Page[GistSummary] stays the documented response model, but returning the rendered
+    # body skips FastAPI's validate-then-encode pass over every item
+    started = time.perf_counter()
+    body = _page_json(items, total, params)
+    if encoding and len(body) >= settings.compress_min_bytes:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = encoded_etag(headers["ETag"], encoding)
+    record_stage("serialize", started)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _ndjson(gists: list[GistSummary]) -> bytes:
+    return b"".join(GIST_SUMMARY.dump_json(gist) + b"\n" for gist in gists)
+
+@router.get("/{username}/export", response_class=StreamingResponse)
+async def export_gists(
+    username: Annotated[GitHubUsername, Path(description="GitHub username")],
+    service: GistService = Depends(get_gist_service),
+    ):
+    """
+    Stream every public gist of a GitHub user as newline-delimited JSON (one GistSummary per line).
+    Each GitHub page is written out as soon as it arrives, so memory stays flat and
+    the first bytes go out after a single upstream round trip.
+    """
+    pages = service.iter_pages(username)
+    # Fetch the first page up front so upstream errors still map to a proper status code
+    first = await anext(pages)
+
+    if not first:
+        await pages.aclose()
+        logger.info(f"User '{username}' has no gists or doesn't exist.")
+        raise HTTPException(status_code=404, detail=f"No gists found for GitHub user '{username}'.")
+
+    async def body():
+        try:
+            yield _ndjson(first)
+            async for gists in pages:
+                yield _ndjson(gists)
+        except HTTPException as exc:
+            # Headers are already sent; abort so the client sees a truncated stream, not a short one
+            logger.error(f"Export for '{username}' aborted mid-stream: {exc.status_code} {exc.detail}")
+            raise
+        finally:
+            await pages.aclose()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+# Upstream headers that describe the forwarded bytes
+_FILE_HEADERS = ("Content-Type", "Content-Length", "Content-Range")
+
+def _file_response(content: bytes, content_type: str | None, range_header: str | None, headers: dict) -> Response:
+    """
+    A cached file's content, or the byte range of it the client asked for.
     """
-    url = f"https://api.github.com/users/{username}/gists"
-    headers = {}
-    github_token = os.getenv("GITHUB_TOKEN")
-    headers = {"Authorization": f"token {github_token}"} if github_token else {}
     try:
-        response = requests.get(url, headers=headers, timeout=5)
-        logger.info(f"printing the url response: {response}")
-        if response.status_code == 404:
-            logger.warning(f"GitHub user '{username}' not found.")
-            raise HTTPException(status_code=response.status_code, detail=f"GitHub user '{username}' not found.")
-        
-        elif response.status_code == 403:
-            logger.warning(f"Rate limit exceeded for user '{username}'.")
-            raise HTTPException(status_code=response.status_code, detail="Rate limit exceeded. Please try again later.")
-        
-        elif response.status_code != 200:
-            logger.error(f"Error fetching gists for {username}: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=response.status_code, detail="Error fetching gists from GitHub.") 
-               
-        gists = response.json()
-        
-        if not isinstance(gists, list):
-            logger.error(f"Invalid response from GitHub for user '{username}': {gists}")
-            raise HTTPException(status_code=502, detail="Invalid response from GitHub API.")
-        
-        result = [
-            GistSummary(
-                id=gist.get("id"),
-                html_url=gist.get("html_url"),
-                description=gist.get("description")
-            )
-            for gist in gists
-        ]
-        
-        if not result:
-            logger.info(f"User '{username}' has no gists or doesn't exist.")
+        span = byte_range(range_header, len(content))
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(content)}"})
+    if span is None:
+        return Response(content, media_type=content_type, headers=headers)
+    start, end = span
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+    return Response(content[start:end + 1], status_code=206, media_type=content_type, headers=headers)
+
+@router.get("/{username}/{gist_id}/files/{filename}", response_class=StreamingResponse)
+async def get_gist_file(
+    request: Request,
+    username: Annotated[GitHubUsername, Path(description="GitHub username")],
+    gist_id: str = Path(..., max_length=64, pattern=r"^[0-9a-fA-F]+$", description="Gist ID"),
+    filename: str = Path(..., max_length=255, description="Name of a file in the gist"),
+    files: GistFileService = Depends(get_file_service),
+    settings: Settings = Depends(get_settings),
+    ):
+    """
+    Raw content of one file of a gist, proxied from GitHub through the shared connection pool.
+    Supports single byte ranges (Range) and If-None-Match. Small files are served from a
+    content-addressed in-memory store; larger ones are streamed through in chunks, so
+    memory per request stays flat whatever the file size.
+    """
+    file = await files.resolve(username, gist_id, filename)
+    # The raw URL names the gist revision, so it identifies the content exactly
+    headers = {
+        "ETag": strong_etag((file.raw_url,)),
+        "Cache-Control": f"public, max-age={settings.http_max_age}",
+        "Accept-Ranges": "bytes",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if etag_matches(request.headers.get("If-None-Match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("Range")
+    cached = files.cached(file)
+    if cached is not None:
+        GIST_FILE_RESPONSES.labels("cache").inc()
+        return _file_response(*cached, range_header, headers)
+    if files.cacheable(file):
+        GIST_FILE_RESPONSES.labels("fetched").inc()
+        return _file_response(*await files.fetch(file), range_header, headers)
+
+    GIST_FILE_RESPONSES.labels("streamed").inc()
+    upstream = await files.open(file, range_header)
+    headers.update((name, upstream.headers[name]) for name in _FILE_HEADERS if name in upstream.headers)
+    if "Content-Encoding" in upstream.headers:
+        # Identity was asked for but not honoured; the body is decoded, so its length differs
+        headers.pop("Content-Length", None)
+
+    async def body():
+        try:
+            async for chunk in upstream.aiter_bytes(settings.file_chunk_size):
+                yield chunk
+        except httpx.HTTPError as exc:
+            # Headers are already sent; abort so the client sees a truncated body
+            logger.error(f"Proxy of {file.raw_url} aborted mid-stream: {exc!r}")
+            raise
+        finally:
+            # Also runs when the client goes away, returning the connection to the pool
+            await upstream.aclose()
+
+    return StreamingResponse(body(), status_code=upstream.status_code, headers=headers)
+
+
+async def _lookup(service: GistService, username: str, size: int) -> BatchResult:
+    """
+    Resolve one batch entry, mapping errors the same way GET /{username} does.
+    """
+    try:
+        items, total = await service.get_window(username, 0, size)
+        if not total:
             raise HTTPException(status_code=404, detail=f"No gists found for GitHub user '{username}'.")
-        
-        return paginate(result)
-    
-    except requests.exceptions.Timeout:
-        logger.error(f"Timeout while fetching gists for user '{username}'")
-        raise HTTPException(status_code=504, detail="GitHub API timed out.")
-    
-    except requests.RequestException as e:
-        logger.error(f"Unexpected error while contacting GitHub {username}: {e}")
-        raise HTTPException(status_code=502, detail="Error communicating with GitHub API.")
-    
-    except HTTPException:
-         # re-raise known HTTP errors as-is
-        raise
-    
-    except Exception as e:
-        logger.error(f"An unexpected error occurred: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error. Please try again later.")
+        return BatchResult(username=username, status_code=200, total=total, items=items)
+    except HTTPException as exc:
+        return BatchResult(username=username, status_code=exc.status_code, detail=exc.detail)
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch_gists(
+    request: BatchRequest,
+    size: int = Query(50, ge=1, le=100, description="Gists returned per username"),
+    service: GistService = Depends(get_gist_service),
+    settings: Settings = Depends(get_settings),
+    ):
+    """
+    Look up the first `size` gists of many GitHub users in one call.
+    Upstream fetches fan out with bounded concurrency; each username gets either
+    its gists and total, or the status code and detail of its error.
+    """
+    results = await gather_limited(
+        (_lookup(service, username, size) for username in request.usernames),
+        settings.batch_concurrency,
+    )
+    return BatchResponse(results=results)
+
+@router.post("/batch/stream", response_class=StreamingResponse)
+async def batch_gists_stream(
+    request: BatchRequest,
+    size: int = Query(50, ge=1, le=100, description="Gists returned per username"),
+    service: GistService = Depends(get_gist_service),
+    settings: Settings = Depends(get_settings),
+    ):
+    """
+    Streaming variant of POST /batch: one BatchResult per line (NDJSON), in completion order.
+    """
+    semaphore = asyncio.Semaphore(settings.batch_concurrency)
+
+    async def limited(username: str) -> BatchResult:
+        async with semaphore:
+            return await _lookup(service, username, size)
+
+    async def body():
+        tasks = [asyncio.create_task(limited(username)) for username in request.usernames]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield result.model_dump_json().encode() + b"\n"
+        finally:
+            # Client went away: stop the remaining lookups
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Runtime configuration, read from the environment (and `.env` via python-dotenv).
+    """
+    github_api_url: str = field(default_factory=lambda: os.getenv("GITHUB_API_URL", "https://api.github.com"))
+    github_token: str | None = field(default_factory=lambda: os.getenv("GITHUB_TOKEN") or None)
+    # Extra tokens for the rate-limit pool, comma separated
+    github_tokens: tuple[str, ...] = field(
+        default_factory=lambda: tuple(t.strip() for t in os.getenv("GITHUB_TOKENS", "").split(",") if t.strip())
+    )
+    # Stop using a token once its remaining budget drops to this many requests
+    rate_limit_reserve: int = field(default_factory=lambda: _env_int("GITHUB_RATE_LIMIT_RESERVE", 5))
+
+    # Upstream connection pool
+    http2: bool = field(default_factory=lambda: _env_bool("GITHUB_HTTP2", True))
+    max_connections: int = field(default_factory=lambda: _env_int("GITHUB_MAX_CONNECTIONS", 100))
+    max_keepalive_connections: int = field(default_factory=lambda: _env_int("GITHUB_MAX_KEEPALIVE_CONNECTIONS", 20))
+    keepalive_expiry: float = field(default_factory=lambda: _env_float("GITHUB_KEEPALIVE_EXPIRY", 30.0))
+
+    # Upstream timeouts (seconds)
+    connect_timeout: float = field(default_factory=lambda: _env_float("GITHUB_CONNECT_TIMEOUT", 3.0))
+    read_timeout: float = field(default_factory=lambda: _env_float("GITHUB_TIMEOUT", 5.0))
+    pool_timeout: float = field(default_factory=lambda: _env_float("GITHUB_POOL_TIMEOUT", 2.0))
+
+    # Upstream pagination: gists per GitHub page (max 100) and parallel page fetches per request
+    per_page: int = field(default_factory=lambda: _env_int("GITHUB_PER_PAGE", 100))
+    page_concurrency: int = field(default_factory=lambda: _env_int("GITHUB_PAGE_CONCURRENCY", 4))
+
+    # Upstream resilience: consecutive failures that open the circuit breaker, seconds before
+    # a half-open probe, retries per idempotent call (base backoff in seconds, and the share
+    # of traffic retries may add), and hedging slow calls past the recent p95 latency
+    breaker_failures: int = field(default_factory=lambda: _env_int("GITHUB_BREAKER_FAILURES", 5))
+    breaker_reset: float = field(default_factory=lambda: _env_float("GITHUB_BREAKER_RESET", 30.0))
+    retries: int = field(default_factory=lambda: _env_int("GITHUB_RETRIES", 2))
+    retry_backoff: float = field(default_factory=lambda: _env_float("GITHUB_RETRY_BACKOFF", 0.1))
+    retry_budget: float = field(default_factory=lambda: _env_float("GITHUB_RETRY_BUDGET", 0.1))
+    hedge: bool = field(default_factory=lambda: _env_bool("GITHUB_HEDGE", False))
+
+    # Refresh-ahead: keep the top-K most requested usernames warm (0 disables), checked every
+    # interval seconds; seed usernames are loaded at startup. Paused while the token pool has
+    # fewer than min_budget requests left. Popularity halves every half_life seconds.
+    refresh_top_k: int = field(default_factory=lambda: _env_int("GIST_REFRESH_TOP_K", 50))
+    refresh_interval: float = field(default_factory=lambda: _env_float("GIST_REFRESH_INTERVAL", 10.0))
+    refresh_seed: tuple[str, ...] = field(
+        default_factory=lambda: tuple(u.strip() for u in os.getenv("GIST_REFRESH_SEED", "").split(",") if u.strip())
+    )
+    refresh_min_budget: int = field(default_factory=lambda: _env_int("GIST_REFRESH_MIN_BUDGET", 500))
+    popularity_half_life: float = field(default_factory=lambda: _env_float("GIST_POPULARITY_HALF_LIFE", 300.0))
+
+    # Client-facing caching of GET /{username}: Cache-Control lifetimes (seconds), and the
+    # smallest body worth compressing (bytes)
+    http_max_age: int = field(default_factory=lambda: _env_int("GIST_HTTP_MAX_AGE", 60))
+    http_stale_while_revalidate: int = field(default_factory=lambda: _env_int("GIST_HTTP_STALE_WHILE_REVALIDATE", 300))
+    compress_min_bytes: int = field(default_factory=lambda: _env_int("GIST_COMPRESS_MIN_BYTES", 1024))
+
+    # Search: usernames whose gist index is kept in memory (least recently searched dropped first)
+    search_users: int = field(default_factory=lambda: _env_int("GIST_SEARCH_USERS", 256))
+
+    # Gist file proxy: files up to max_file_bytes are kept in a content-addressed store of
+    # at most cache_bytes; larger ones are streamed in chunk_size pieces
+    file_cache_max_file_bytes: int = field(default_factory=lambda: _env_int("GIST_FILE_CACHE_MAX_FILE_BYTES", 256 * 1024))
+    file_cache_max_bytes: int = field(default_factory=lambda: _env_int("GIST_FILE_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+    file_chunk_size: int = field(default_factory=lambda: _env_int("GIST_FILE_CHUNK_SIZE", 64 * 1024))
+
+    # Parallel usernames resolved per POST /batch request
+    batch_concurrency: int = field(default_factory=lambda: _env_int("GIST_BATCH_CONCURRENCY", 10))
+
+    # Observability: Server-Timing breakdown header and event-loop lag sampling period (seconds)
+    server_timing: bool = field(default_factory=lambda: _env_bool("SERVER_TIMING", False))
+    loop_lag_interval: float = field(default_factory=lambda: _env_float("EVENT_LOOP_LAG_INTERVAL", 0.5))
+
+    # Gist cache: "memory" (per process) or "sqlite" (shared by all workers, kept across restarts)
+    cache_backend: str = field(default_factory=lambda: os.getenv("GIST_CACHE_BACKEND", "memory").lower())
+    cache_path: str = field(default_factory=lambda: os.getenv("GIST_CACHE_PATH", "/tmp/gist-cache.sqlite3"))
+    cache_ttl: float = field(default_factory=lambda: _env_float("GIST_CACHE_TTL", 60.0))
+    cache_stale_ttl: float = field(default_factory=lambda: _env_float("GIST_CACHE_STALE_TTL", 300.0))
+    cache_max_entries: int = field(default_factory=lambda: _env_int("GIST_CACHE_MAX_ENTRIES", 1024))
+    cache_max_bytes: int = field(default_factory=lambda: _env_int("GIST_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+    @property
+    def tokens(self) -> tuple[str, ...]:
+        tokens = ((self.github_token,) if self.github_token else ()) + self.github_tokens
+        return tuple(dict.fromkeys(tokens))
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
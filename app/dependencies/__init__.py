@@ -1 +1,18 @@
-# This file is intentionally left blank.
\ No newline at end of file
+from fastapi import Request
+
+from app.services.files import GistFileService
+from app.services.gists import GistService
+
+
+def get_gist_service(request: Request) -> GistService:
+    """
+    Return the cached gist service created in the app lifespan.
+    """
+    return request.app.state.gist_service
+
+
+def get_file_service(request: Request) -> GistFileService:
+    """
+    Return the gist file proxy service created in the app lifespan.
+    """
+    return request.app.state.file_service
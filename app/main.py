@@ -1,8 +1,17 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.routes import router as gists_router
+from app.config import get_settings
+from app.services.files import GistFileService
+from app.services.gists import GistService, create_gist_cache
+from app.services.github import create_http_client, create_raw_client, create_token_pool
+from app.services.popularity import DecayedCounter
+from app.services.refresher import RefreshScheduler
+from app.services.metrics import REGISTRY, MetricsMiddleware, gauges, monitor_event_loop_lag, token_gauges
 from fastapi_pagination import add_pagination
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import logging
 from fastapi import Request
 from dotenv import load_dotenv
@@ -11,7 +20,67 @@ load_dotenv()
 
 logger = logging.getLogger("uvicorn.error")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    app.state.token_pool = create_token_pool(settings)
+    # One pooled, keep-alive client to api.github.com shared by every request
+    app.state.http_client = create_http_client(settings, token_pool=app.state.token_pool)
+    app.state.gist_service = GistService(
+        app.state.http_client,
+        create_gist_cache(settings),
+        per_page=settings.per_page,
+        page_concurrency=settings.page_concurrency,
+        popularity=DecayedCounter(settings.popularity_half_life),
+        search_users=settings.search_users,
+    )
+    # Raw file downloads get their own pool, outside the API breaker and retry budget
+    app.state.raw_client = create_raw_client(settings)
+    app.state.file_service = GistFileService(
+        app.state.http_client,
+        app.state.raw_client,
+        ttl=settings.cache_ttl,
+        max_file_bytes=settings.file_cache_max_file_bytes,
+        max_bytes=settings.file_cache_max_bytes,
+    )
+    # Keeps the most requested usernames refreshed ahead of cache expiry
+    refresher = None
+    if settings.refresh_top_k > 0:
+        refresher = asyncio.create_task(RefreshScheduler(
+            app.state.gist_service,
+            app.state.token_pool,
+            top_k=settings.refresh_top_k,
+            interval=settings.refresh_interval,
+            seed=settings.refresh_seed,
+            min_budget=settings.refresh_min_budget,
+        ).run())
+    lag_monitor = None
+    if settings.loop_lag_interval > 0:
+        lag_monitor = asyncio.create_task(monitor_event_loop_lag(settings.loop_lag_interval))
+    try:
+        yield
+    finally:
+        for task in (refresher, lag_monitor):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(t for t in (refresher, lag_monitor) if t is not None), return_exceptions=True)
+        await app.state.gist_service.aclose()
+        await app.state.file_service.aclose()
+        await app.state.http_client.aclose()
+        await app.state.raw_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware, server_timing=get_settings().server_timing)
+
+# Registered before the gists router so /{username} does not capture it.
+# async: the registry and the stats are owned by the event loop, not threadpool-safe
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    extra = gauges("gist_cache", "Gist cache and upstream fetch counters", request.app.state.gist_service.stats())
+    extra += gauges("gist_file_cache", "Gist file proxy cache counters", request.app.state.file_service.stats())
+    extra += token_gauges(request.app.state.token_pool.stats())
+    return PlainTextResponse(REGISTRY.render(extra), media_type="text/plain; version=0.0.4")
+
 app.include_router(gists_router)
 add_pagination(app)
 
@@ -19,6 +88,15 @@ add_pagination(app)
 def read_root():
     return {"message": "Welcome to the GitHub Gits Data fetch API"}
 
+# async: stats read state owned by the event loop (and the cache's connection), not threadpool-safe
+@app.get("/cache/stats")
+async def cache_stats(request: Request):
+    return request.app.state.gist_service.stats()
+
+@app.get("/ratelimit/stats")
+async def ratelimit_stats(request: Request):
+    return request.app.state.token_pool.stats()
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     logger.warning(f"422 Validation error on request to {request.url}: {exc}")
@@ -0,0 +1,71 @@
+from pydantic import BaseModel, Field, TypeAdapter
+
+from app.schemas.common import GitHubUsername
+
+
+class GistSummary(BaseModel):
+    id: str
+    html_url: str
+    description: str | None
+
+
+class GistFile(BaseModel):
+    language: str | None = None
+
+
+class Gist(GistSummary):
+    """
+    A gist as cached: the GistSummary fields clients get, plus the fields search
+    and filtering use. Serializing it as a GistSummary drops the extras.
+    """
+    public: bool = True
+    # ISO 8601 UTC timestamps, which sort correctly as strings
+    created_at: str | None = None
+    updated_at: str | None = None
+    files: dict[str, GistFile] = {}
+
+
+# Parses a GitHub listing straight from bytes, skipping every field Gist does not declare
+GISTS = TypeAdapter(list[Gist])
+# Serializes summaries (and Gists, as summaries) without re-validating them
+GIST_SUMMARY = TypeAdapter(GistSummary)
+GIST_SUMMARIES = TypeAdapter(list[GistSummary])
+
+
+class GistOwner(BaseModel):
+    login: str
+
+
+class GistFileDetail(BaseModel):
+    # Names the gist revision, so the content behind it never changes
+    raw_url: str
+    size: int | None = None
+
+
+class GistDetail(BaseModel):
+    """
+    The parts of GitHub's GET /gists/{gist_id} used to proxy a gist's files.
+    File contents in that response (possibly truncated) are skipped; files are read from raw_url.
+    """
+    owner: GistOwner | None = None
+    files: dict[str, GistFileDetail] = {}
+
+
+class BatchRequest(BaseModel):
+    usernames: list[GitHubUsername] = Field(..., min_length=1, max_length=1000)
+
+
+class BatchResult(BaseModel):
+    """
+    Outcome of one username in a batch lookup: either its first gists and total,
+    or the status code and detail `GET /{username}` would have answered with.
+    """
+    username: str
+    status_code: int
+    total: int | None = None
+    items: list[GistSummary] | None = None
+    detail: str | None = None
+
+
+class BatchResponse(BaseModel):
+    results: list[BatchResult]
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+import time
+from typing import Callable, Generic, Hashable, Protocol, TypeVar
+
+V = TypeVar("V")
+
+
+class CacheState(str, Enum):
+    FRESH = "fresh"
+    STALE = "stale"
+    # Too old to serve, but the value is kept for conditional revalidation
+    EXPIRED = "expired"
+    MISS = "miss"
+
+
+@dataclass
+class CacheEntry(Generic[V]):
+    value: V
+    size: int
+    stored_at: float
+
+
+@dataclass
+class CacheLookup(Generic[V]):
+    state: CacheState
+    value: V | None = None
+    # Seconds since the value was stored; only set by peek()
+    age: float | None = None
+
+
+def state_for_age(age: float, ttl: float, stale_ttl: float) -> CacheState:
+    if age > ttl + stale_ttl:
+        return CacheState.EXPIRED
+    if age > ttl:
+        return CacheState.STALE
+    return CacheState.FRESH
+
+
+class CacheBackend(Protocol[V]):
+    """
+    Interface the gist service uses to store built pages. Lookups report whether
+    the value is fresh, stale (serve and refresh), expired (revalidate) or missing.
+    Backends whose calls do blocking I/O set `blocking`, and are called from a thread.
+    """
+    ttl: float
+    stale_ttl: float
+    blocking: bool
+
+    def __len__(self) -> int: ...
+
+    def __contains__(self, key: Hashable) -> bool: ...
+
+    def get(self, key: Hashable) -> CacheLookup[V]: ...
+
+    def peek(self, key: Hashable) -> CacheLookup[V]: ...
+
+    def set(self, key: Hashable, value: V, size: int) -> None: ...
+
+    def delete(self, key: Hashable) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def stats(self) -> dict[str, int]: ...
+
+    def close(self) -> None: ...
+
+
+class TTLCache(Generic[V]):
+    """
+    Bounded in-memory cache with per-entry TTL and LRU eviction.
+
+    An entry is fresh for `ttl` seconds, then servable as stale for another
+    `stale_ttl` seconds (stale-while-revalidate). After that it is reported as
+    expired, but stays in the cache (subject to LRU eviction) so callers can
+    revalidate it upstream instead of refetching from scratch.
+    Eviction kicks in when either `max_entries` or the approximate total
+    `max_bytes` is exceeded, oldest-used first.
+    """
+    blocking = False
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        max_entries: int = 1024,
+        max_bytes: int = 32 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, CacheEntry[V]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> CacheLookup[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return CacheLookup(CacheState.MISS)
+
+        self._entries.move_to_end(key)
+        age = self._clock() - entry.stored_at
+        if age > self.ttl + self.stale_ttl:
+            self.expirations += 1
+            self.misses += 1
+            return CacheLookup(CacheState.EXPIRED, entry.value)
+
+        if age > self.ttl:
+            self.stale_hits += 1
+            return CacheLookup(CacheState.STALE, entry.value)
+        self.hits += 1
+        return CacheLookup(CacheState.FRESH, entry.value)
+
+    def peek(self, key: Hashable) -> CacheLookup[V]:
+        """
+        Like get(), plus the entry's age, but without counting a hit or miss or
+        refreshing its LRU position. For background maintenance, not for serving.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return CacheLookup(CacheState.MISS)
+        age = self._clock() - entry.stored_at
+        return CacheLookup(state_for_age(age, self.ttl, self.stale_ttl), entry.value, age)
+
+    def set(self, key: Hashable, value: V, size: int) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            # Never let one oversized value flush the whole cache
+            return
+        self._entries[key] = CacheEntry(value=value, size=size, stored_at=self._clock())
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def close(self) -> None:
+        self.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
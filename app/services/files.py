@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import math
+
+import httpx
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.schemas.gists import GistDetail, GistFileDetail
+from app.services.cache import CacheState, TTLCache
+from app.services.ratelimit import RateLimitExhausted
+from app.services.resilience import CircuitOpen
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger("uvicorn.error")
+
+# Rough overhead of a cached GistDetail, and of each of its files, in bytes
+_DETAIL_OVERHEAD = 200
+_FILE_OVERHEAD = 150
+
+
+def upstream_error(exc: Exception, what: str) -> HTTPException:
+    """
+    The HTTPException a failed GitHub call maps to, as for gist listings.
+    """
+    if isinstance(exc, RateLimitExhausted):
+        logger.warning(f"Rate limit budget exhausted; not fetching {what}")
+        return HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded. Please try again later.",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    if isinstance(exc, CircuitOpen):
+        logger.warning(f"GitHub circuit breaker open; not fetching {what}")
+        return HTTPException(
+            status_code=503,
+            detail="GitHub API is unavailable. Please try again later.",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    if isinstance(exc, httpx.TimeoutException):
+        logger.error(f"Timeout while fetching {what}")
+        return HTTPException(status_code=504, detail="GitHub API timed out.")
+    logger.error(f"Unexpected error while fetching {what}: {exc}")
+    return HTTPException(status_code=502, detail="Error communicating with GitHub API.")
+
+
+class GistFileService:
+    """
+    Resolves gist files to their raw URLs (through the GitHub API `client`) and
+    proxies their content (through `raw_client`).
+
+    Gist metadata (one API call per gist) is cached for `ttl` seconds. A raw URL
+    names the gist revision, so its content never changes: files of up to
+    `max_file_bytes` are kept in an LRU store capped at `max_bytes`, keyed by a
+    digest of their content so a file shared by several gists or revisions is held
+    once. Larger files are streamed in chunks and never held in memory whole.
+    Raw content is fetched without the API token, so it costs no rate-limit budget.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        raw_client: httpx.AsyncClient,
+        ttl: float = 60.0,
+        max_file_bytes: int = 256 * 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.client = client
+        self.raw_client = raw_client
+        self.max_file_bytes = max_file_bytes
+        self.details: TTLCache[GistDetail] = TTLCache(ttl=ttl)
+        # raw_url -> (content digest, content type); digest -> content
+        self.refs: TTLCache[tuple[str, str | None]] = TTLCache(ttl=math.inf, max_entries=8 * 1024)
+        self.blobs: TTLCache[bytes] = TTLCache(ttl=math.inf, max_entries=8 * 1024, max_bytes=max_bytes)
+        self._flight: SingleFlight = SingleFlight()
+
+    async def resolve(self, username: str, gist_id: str, filename: str) -> GistFileDetail:
+        """
+        Raw URL and size of `filename` in gist `gist_id`, which must belong to `username`.
+        """
+        lookup = self.details.get(gist_id)
+        if lookup.state is CacheState.FRESH:
+            detail = lookup.value
+        else:
+            detail = await self._flight.do(("detail", gist_id), lambda: self._load_detail(gist_id))
+        if detail.owner is None or detail.owner.login.lower() != username.lower():
+            logger.warning(f"Gist '{gist_id}' does not belong to GitHub user '{username}'.")
+            raise HTTPException(status_code=404, detail=f"Gist '{gist_id}' of GitHub user '{username}' not found.")
+        file = detail.files.get(filename)
+        if file is None:
+            raise HTTPException(status_code=404, detail=f"File '{filename}' not found in gist '{gist_id}'.")
+        return file
+
+    def cached(self, file: GistFileDetail) -> tuple[bytes, str | None] | None:
+        """
+        Content and content type of `file` if it is held in the store.
+        """
+        ref = self.refs.get(file.raw_url)
+        if ref.state is CacheState.MISS:
+            return None
+        digest, content_type = ref.value
+        blob = self.blobs.get(digest)
+        return None if blob.state is CacheState.MISS else (blob.value, content_type)
+
+    def cacheable(self, file: GistFileDetail) -> bool:
+        return file.size is not None and file.size <= self.max_file_bytes
+
+    async def fetch(self, file: GistFileDetail) -> tuple[bytes, str | None]:
+        """
+        Download a small (cacheable) file whole and add it to the store.
+        """
+        async def load() -> tuple[bytes, str | None]:
+            response = await self.open(file)
+            try:
+                content = await response.aread()
+            except httpx.HTTPError as exc:
+                raise upstream_error(exc, f"raw file {file.raw_url}")
+            finally:
+                await response.aclose()
+            content_type = response.headers.get("Content-Type")
+            if len(content) <= self.max_file_bytes:
+                digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+                self.blobs.set(digest, content, len(content))
+                self.refs.set(file.raw_url, (digest, content_type), len(file.raw_url) + len(digest))
+            return content, content_type
+
+        return await self._flight.do(("raw", file.raw_url), load)
+
+    async def open(self, file: GistFileDetail, range_header: str | None = None) -> httpx.Response:
+        """
+        Start downloading `file`, optionally only the `range_header` bytes. The body is
+        not read: the caller streams it and must close the response.
+        Successful answers are 200, 206 (partial) and 416 (range not satisfiable).
+        """
+        # identity keeps ranges and Content-Length about the bytes actually forwarded
+        headers = {"Accept": "*/*", "Accept-Encoding": "identity"}
+        if range_header:
+            headers["Range"] = range_header
+        request = self.raw_client.build_request("GET", file.raw_url, headers=headers)
+        try:
+            response = await self.raw_client.send(request, stream=True)
+        except httpx.HTTPError as exc:
+            raise upstream_error(exc, f"raw file {file.raw_url}")
+        if response.status_code in (200, 206, 416):
+            return response
+        await response.aclose()
+        logger.error(f"Error fetching raw file {file.raw_url}: {response.status_code}")
+        if response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Gist file content not found.")
+        raise HTTPException(status_code=502, detail="Error fetching gist file from GitHub.")
+
+    def stats(self) -> dict[str, int]:
+        blobs = self.blobs.stats()
+        return {
+            "gists": len(self.details),
+            "files": len(self.refs),
+            "blobs": blobs["entries"],
+            "bytes": blobs["bytes"],
+            "hits": blobs["hits"],
+            "misses": self.refs.misses + blobs["misses"],
+            "evictions": blobs["evictions"],
+        }
+
+    async def aclose(self) -> None:
+        await self._flight.aclose()
+        for cache in (self.details, self.refs, self.blobs):
+            cache.close()
+
+    async def _load_detail(self, gist_id: str) -> GistDetail:
+        try:
+            response = await self.client.get(f"/gists/{gist_id}")
+        except (RateLimitExhausted, CircuitOpen, httpx.HTTPError) as exc:
+            raise upstream_error(exc, f"gist '{gist_id}'")
+        if response.status_code == 404:
+            logger.warning(f"Gist '{gist_id}' not found.")
+            raise HTTPException(status_code=404, detail=f"Gist '{gist_id}' not found.")
+        if response.status_code == 403:
+            logger.warning(f"Rate limit exceeded for gist '{gist_id}'.")
+            raise HTTPException(status_code=403, detail="Rate limit exceeded. Please try again later.")
+        if response.status_code != 200:
+            logger.error(f"Error fetching gist {gist_id}: {response.status_code} - {response.text}")
+            raise HTTPException(status_code=response.status_code, detail="Error fetching gist from GitHub.")
+        try:
+            detail = GistDetail.model_validate_json(response.content)
+        except ValidationError as e:
+            logger.error(f"Invalid response from GitHub for gist '{gist_id}': {e.error_count()} invalid values")
+            raise HTTPException(status_code=502, detail="Invalid response from GitHub API.")
+        size = _DETAIL_OVERHEAD + sum(_FILE_OVERHEAD + len(name) + len(f.raw_url) for name, f in detail.files.items())
+        self.details.set(gist_id, detail, size)
+        return detail
@@ -0,0 +1,492 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import struct
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterable, TypeVar
+
+import httpx
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.config import Settings
+from app.schemas.gists import GISTS, Gist, GistFile
+from app.services.cache import CacheBackend, CacheState, TTLCache
+from app.services.metrics import PAGINATION_UPSTREAM_PAGES, record_stage
+from app.services.popularity import DecayedCounter
+from app.services.ratelimit import RateLimitExhausted
+from app.services.resilience import CircuitOpen
+from app.services.search import GistIndex, SortField
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger("uvicorn.error")
+
+T = TypeVar("T")
+
+# (username, page, per_page)
+PageKey = tuple[str, int, int]
+
+# Rough per-object overhead of a Gist plus its list slot, and of each of its files, in bytes
+_GIST_OVERHEAD = 300
+_FILE_OVERHEAD = 150
+
+# GitHub caps per_page at 100 on list endpoints
+MAX_PER_PAGE = 100
+
+# Binary layout of a CachedGists: version, last_page (0 = none), has_next, gist count,
+# etag, last_modified, then per gist its strings, public flag and file count, and each
+# file's name and language. Strings are length-prefixed UTF-8 (0xFFFFFFFF = None).
+_CODEC_VERSION = 2
+_HEADER = struct.Struct("<BI?I")
+_GIST = struct.Struct("<?I")
+_LENGTH = struct.Struct("<I")
+_NONE = 0xFFFFFFFF
+
+
+def estimate_size(gists: list[Gist]) -> int:
+    """
+    Approximate memory held by a list of gists, used for cache byte limits.
+    """
+    return sum(
+        _GIST_OVERHEAD + len(g.id) + len(g.html_url) + len(g.description or "")
+        + sum(_FILE_OVERHEAD + len(name) for name in g.files)
+        for g in gists
+    )
+
+
+def _link_page(response: httpx.Response, rel: str) -> int | None:
+    """
+    Page number of the `rel` target in GitHub's Link header, if present.
+    """
+    link = response.links.get(rel)
+    if not link:
+        return None
+    page = httpx.URL(link["url"]).params.get("page")
+    return int(page) if page and page.isdigit() else None
+
+
+async def gather_limited(aws: Iterable[Awaitable[T]], limit: int) -> list[T]:
+    """
+    Like asyncio.gather, but runs at most `limit` awaitables at a time.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw: Awaitable[T]) -> T:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws))
+
+
+@dataclass
+class CachedGists:
+    """
+    Built gists for one upstream page, plus the validators and pagination
+    links GitHub sent with it.
+    """
+    gists: list[Gist]
+    etag: str | None = None
+    last_modified: str | None = None
+    # From the Link header: rel="last" page number and whether rel="next" exists
+    last_page: int | None = None
+    has_next: bool = False
+
+    def size(self) -> int:
+        return estimate_size(self.gists) + len(self.etag or "") + len(self.last_modified or "")
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact binary form used by shared cache backends.
+        """
+        parts = [_HEADER.pack(_CODEC_VERSION, self.last_page or 0, self.has_next, len(self.gists))]
+
+        def put(text: str | None) -> None:
+            if text is None:
+                parts.append(_LENGTH.pack(_NONE))
+                return
+            data = text.encode()
+            parts.append(_LENGTH.pack(len(data)))
+            parts.append(data)
+
+        put(self.etag)
+        put(self.last_modified)
+        for gist in self.gists:
+            put(gist.id)
+            put(gist.html_url)
+            put(gist.description)
+            put(gist.created_at)
+            put(gist.updated_at)
+            parts.append(_GIST.pack(gist.public, len(gist.files)))
+            for name, file in gist.files.items():
+                put(name)
+                put(file.language)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CachedGists":
+        version, last_page, has_next, count = _HEADER.unpack_from(data)
+        if version != _CODEC_VERSION:
+            raise ValueError(f"Unsupported cache entry version {version}")
+        view = memoryview(data)
+        offset = _HEADER.size
+
+        def take() -> str | None:
+            nonlocal offset
+            (length,) = _LENGTH.unpack_from(view, offset)
+            offset += _LENGTH.size
+            if length == _NONE:
+                return None
+            text = str(view[offset:offset + length], "utf-8")
+            offset += length
+            return text
+
+        def take_gist() -> Gist:
+            nonlocal offset
+            id, html_url, description, created_at, updated_at = take(), take(), take(), take(), take()
+            public, file_count = _GIST.unpack_from(view, offset)
+            offset += _GIST.size
+            files = {take(): GistFile.model_construct(language=take()) for _ in range(file_count)}
+            # Values were validated when first built; skip re-validation
+            return Gist.model_construct(
+                id=id, html_url=html_url, description=description, public=public,
+                created_at=created_at, updated_at=updated_at, files=files,
+            )
+
+        etag = take()
+        last_modified = take()
+        gists = [take_gist() for _ in range(count)]
+        if offset != len(data):
+            raise ValueError("Trailing bytes in cache entry")
+        return cls(gists, etag=etag, last_modified=last_modified, last_page=last_page or None, has_next=has_next)
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def create_gist_cache(settings: Settings) -> CacheBackend[CachedGists]:
+    """
+    Build the configured cache backend: per-process memory, or a SQLite file shared
+    by every worker on the host.
+    """
+    options = dict(
+        ttl=settings.cache_ttl,
+        stale_ttl=settings.cache_stale_ttl,
+        max_entries=settings.cache_max_entries,
+        max_bytes=settings.cache_max_bytes,
+    )
+    if settings.cache_backend == "sqlite":
+        from app.services.sqlite_cache import SQLiteCache
+        return SQLiteCache(settings.cache_path, CachedGists.to_bytes, CachedGists.from_bytes, **options)
+    if settings.cache_backend != "memory":
+        raise ValueError(f"Unknown GIST_CACHE_BACKEND '{settings.cache_backend}'")
+    return TTLCache(**options)
+
+
+class GistService:
+    """
+    Fetches a user's gists from GitHub and keeps the built summaries in a TTL cache,
+    one entry per upstream page.
+    Stale entries are served immediately while a single background refresh runs.
+    Refreshes are conditional (If-None-Match / If-Modified-Since), so an unchanged
+    page costs a 304 that GitHub does not count against the rate limit.
+    Concurrent loads of the same page share a single upstream call.
+    Listings are counted per username in `popularity`, so hot users can be
+    refreshed ahead of expiry (see RefreshScheduler).
+    When GitHub's rate limit is exhausted, GitHub is failing or the circuit breaker
+    is open, an expired cached page is served rather than failing the request.
+    Searches are answered from a GistIndex per username (the `search_users` most
+    recently searched are kept), re-indexed only where cached pages changed.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        cache: CacheBackend[CachedGists],
+        per_page: int = MAX_PER_PAGE,
+        page_concurrency: int = 4,
+        popularity: DecayedCounter[str] | None = None,
+        search_users: int = 256,
+    ):
+        self.client = client
+        self.cache = cache
+        self.per_page = min(per_page, MAX_PER_PAGE)
+        self.page_concurrency = page_concurrency
+        self.popularity = popularity or DecayedCounter()
+        self._refreshing: dict[PageKey, asyncio.Task] = {}
+        self._flight: SingleFlight[CachedGists] = SingleFlight()
+        self.search_users = search_users
+        self._indexes: OrderedDict[str, GistIndex] = OrderedDict()
+        self.full_fetches = 0
+        self.not_modified = 0
+
+    def page_key(self, username: str, page: int) -> PageKey:
+        """
+        Cache key of one upstream page. It includes `per_page`, since the same page
+        number holds other gists at another page size (the SQLite cache outlives
+        configuration changes).
+        """
+        return username.lower(), page, self.per_page
+
+    async def get_page(self, username: str, page: int = 1) -> CachedGists:
+        """
+        One upstream page (of `per_page` gists) for `username`.
+        """
+        key = self.page_key(username, page)
+        lookup = await self._cache_call(self.cache.get, key)
+        if lookup.state is CacheState.FRESH:
+            return lookup.value
+        if lookup.state is CacheState.STALE:
+            self._schedule_refresh(key, username, lookup.value)
+            return lookup.value
+        try:
+            return await self._load(key, username, lookup.value)
+        except HTTPException as exc:
+            # Rate limited, or GitHub failing / circuit open: an old answer beats an error
+            if lookup.value is None or (exc.status_code not in (403, 429) and exc.status_code < 500):
+                raise
+            logger.warning(f"GitHub answered {exc.status_code}; serving expired cache for '{username}' page {page}")
+            return lookup.value
+
+    async def get_window(self, username: str, offset: int, limit: int) -> tuple[list[Gist], int]:
+        """
+        Gists `offset` to `offset + limit` of `username`, plus the user's total gist count.
+        Only the upstream pages covering the window are fetched (concurrently), and
+        the total comes from the Link header rather than a full crawl.
+        """
+        self.popularity.hit(username.lower())
+        first = offset // self.per_page + 1
+        last = (offset + limit - 1) // self.per_page + 1
+        numbers = range(first, last + 1)
+        PAGINATION_UPSTREAM_PAGES.observe(len(numbers))
+        fetched = await gather_limited(
+            (self.get_page(username, n) for n in numbers), self.page_concurrency
+        )
+        pages = dict(zip(numbers, fetched))
+
+        total = await self._total(username, pages)
+        items = [gist for page in fetched for gist in page.gists]
+        start = offset - (first - 1) * self.per_page
+        return items[start:start + limit], total
+
+    async def get_all_pages(self, username: str) -> list[CachedGists]:
+        """
+        Every upstream page of `username`, through the cache. After the first page,
+        the rest up to its rel="last" are fetched concurrently.
+        """
+        pages = [await self.get_page(username, 1)]
+        last = pages[0].last_page or 1
+        pages += await gather_limited(
+            (self.get_page(username, n) for n in range(2, last + 1)), self.page_concurrency
+        )
+        # No rel="last" to go by (or the listing grew since): follow rel="next"
+        while pages[-1].has_next:
+            pages.append(await self.get_page(username, len(pages) + 1))
+        return pages
+
+    async def search(
+        self,
+        username: str,
+        q: str | None = None,
+        language: str | None = None,
+        public: bool | None = None,
+        sort: SortField | None = None,
+    ) -> tuple[list[Gist], int]:
+        """
+        The gists of `username` matching the filters (see GistIndex.query), plus the
+        user's total gist count. Once the user's pages are cached, no GitHub call is made.
+        """
+        key = username.lower()
+        self.popularity.hit(key)
+        pages = await self.get_all_pages(username)
+
+        started = time.perf_counter()
+        index = self._indexes.pop(key, None) or GistIndex()
+        self._indexes[key] = index
+        if len(self._indexes) > self.search_users:
+            self._indexes.popitem(last=False)
+        for number, page in enumerate(pages, start=1):
+            index.update(number, page.gists, page.etag)
+        index.truncate(len(pages))
+        matches = index.query(q, language, public, sort)
+        record_stage("search", started)
+        return matches, len(index)
+
+    async def refresh_ahead(self, username: str, lead: float) -> bool:
+        """
+        Reload the first page of `username`, and the last page the total is read from,
+        if it is missing or stops being fresh within `lead` seconds. Reloads are
+        conditional, so an unchanged page costs a free 304. Returns whether GitHub was called.
+        """
+        key = self.page_key(username, 1)
+        lookup = await self._cache_call(self.cache.peek, key)
+        if lookup.state is CacheState.FRESH and lookup.age < self.cache.ttl - lead:
+            return False
+        first = await self._load(key, username, lookup.value)
+        if first.last_page and first.last_page > 1:
+            last_key = self.page_key(username, first.last_page)
+            last = await self._cache_call(self.cache.peek, last_key)
+            await self._load(last_key, username, last.value)
+        return True
+
+    async def iter_pages(self, username: str) -> AsyncIterator[list[Gist]]:
+        """
+        Every gist of `username`, one upstream page at a time, following Link rel="next".
+        Pages bypass the cache so a bulk walk never evicts hot entries. The next page
+        is prefetched while the caller consumes the current one, so at most two pages
+        are held in memory; closing the iterator cancels the prefetch.
+        """
+        number = 1
+        page = await self._fetch(username, number)
+        while True:
+            prefetch = asyncio.create_task(self._fetch(username, number + 1)) if page.has_next else None
+            try:
+                yield page.gists
+                if prefetch is None:
+                    return
+                page = await prefetch
+                number += 1
+            finally:
+                if prefetch is not None and not prefetch.done():
+                    prefetch.cancel()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            # One row read, maintained by triggers on the SQLite backend
+            **self.cache.stats(),
+            "upstream_full": self.full_fetches,
+            "upstream_not_modified": self.not_modified,
+            "upstream_coalesced": self._flight.coalesced,
+        }
+
+    async def aclose(self) -> None:
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._flight.aclose()
+        await self._cache_call(self.cache.close)
+
+    async def _cache_call(self, fn: Callable[..., T], *args) -> T:
+        # A blocking backend (SQLite) must not stall the event loop
+        if self.cache.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def _total(self, username: str, pages: dict[int, CachedGists]) -> int:
+        last_page = max((p.last_page for p in pages.values() if p.last_page), default=None)
+        if last_page is None:
+            # No rel="last": either we hold the final page, or the window is past the end
+            end = max((n for n, p in pages.items() if p.gists), default=None)
+            if end is not None and not pages[end].has_next:
+                return (end - 1) * self.per_page + len(pages[end].gists)
+            if 1 in pages:
+                return len(pages[1].gists)
+            return await self._total(username, {1: await self.get_page(username, 1)})
+
+        final = pages.get(last_page) or await self.get_page(username, last_page)
+        return (last_page - 1) * self.per_page + len(final.gists)
+
+    async def _load(self, key: PageKey, username: str, previous: CachedGists | None = None) -> CachedGists:
+        async def load() -> CachedGists:
+            entry = await self._fetch(username, key[1], previous)
+            await self._cache_call(self.cache.set, key, entry, entry.size())
+            return entry
+
+        return await self._flight.do(key, load)
+
+    def _schedule_refresh(self, key: PageKey, username: str, previous: CachedGists) -> None:
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key, username, previous))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key: PageKey, username: str, previous: CachedGists) -> None:
+        try:
+            await self._load(key, username, previous)
+        except HTTPException as exc:
+            # Keep serving the stale entry; the next stale hit retries
+            logger.warning(f"Background refresh for '{username}' failed: {exc.status_code} {exc.detail}")
+
+    async def _fetch(self, username: str, page: int, previous: CachedGists | None = None) -> CachedGists:
+        headers = previous.conditional_headers() if previous else {}
+        params = {"page": page, "per_page": self.per_page}
+        try:
+            response = await self.client.get(f"/users/{username}/gists", params=params, headers=headers)
+            logger.debug("GitHub answered %s for '%s' page %s", response.status_code, username, page)
+            if response.status_code == 304 and previous is not None:
+                self.not_modified += 1
+                return CachedGists(
+                    previous.gists,
+                    etag=response.headers.get("ETag", previous.etag),
+                    last_modified=response.headers.get("Last-Modified", previous.last_modified),
+                    last_page=previous.last_page,
+                    has_next=previous.has_next,
+                )
+
+            elif response.status_code == 404:
+                logger.warning(f"GitHub user '{username}' not found.")
+                raise HTTPException(status_code=response.status_code, detail=f"GitHub user '{username}' not found.")
+
+            elif response.status_code == 403:
+                logger.warning(f"Rate limit exceeded for user '{username}'.")
+                raise HTTPException(status_code=response.status_code, detail="Rate limit exceeded. Please try again later.")
+
+            elif response.status_code != 200:
+                logger.error(f"Error fetching gists for {username}: {response.status_code} - {response.text}")
+                raise HTTPException(status_code=response.status_code, detail="Error fetching gists from GitHub.")
+
+            started = time.perf_counter()
+            try:
+                summaries = GISTS.validate_json(response.content)
+            except ValidationError as e:
+                logger.error(f"Invalid response from GitHub for user '{username}': {e.error_count()} invalid values")
+                raise HTTPException(status_code=502, detail="Invalid response from GitHub API.")
+            record_stage("parse", started)
+
+            self.full_fetches += 1
+            return CachedGists(
+                summaries,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                last_page=_link_page(response, "last"),
+                has_next="next" in response.links,
+            )
+
+        except RateLimitExhausted as e:
+            logger.warning(f"Rate limit budget exhausted; not calling GitHub for '{username}'")
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please try again later.",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+
+        except CircuitOpen as e:
+            logger.warning(f"GitHub circuit breaker open; not calling GitHub for '{username}'")
+            raise HTTPException(
+                status_code=503,
+                detail="GitHub API is unavailable. Please try again later.",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+
+        except httpx.TimeoutException:
+            logger.error(f"Timeout while fetching gists for user '{username}'")
+            raise HTTPException(status_code=504, detail="GitHub API timed out.")
+
+        except httpx.HTTPError as e:
+            logger.error(f"Unexpected error while contacting GitHub {username}: {e}")
+            raise HTTPException(status_code=502, detail="Error communicating with GitHub API.")
+
+        except HTTPException:
+            # re-raise known HTTP errors as-is
+            raise
+
+        except Exception as e:
+            logger.error(f"An unexpected error occurred: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error. Please try again later.")
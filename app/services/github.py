@@ -0,0 +1,65 @@
+import httpx
+
+from app.config import Settings
+from app.services.metrics import InstrumentedTransport
+from app.services.ratelimit import TokenPool, TokenPoolAuth
+from app.services.resilience import CircuitBreaker, ResilientTransport, RetryBudget
+
+
+def create_token_pool(settings: Settings) -> TokenPool:
+    return TokenPool(list(settings.tokens), reserve=settings.rate_limit_reserve)
+
+
+def create_http_client(
+    settings: Settings,
+    transport: httpx.AsyncBaseTransport | None = None,
+    token_pool: TokenPool | None = None,
+) -> httpx.AsyncClient:
+    """
+    Build the shared async client used for every call to the GitHub API.
+    Connections to api.github.com are pooled and kept alive between requests.
+    Each request is signed with the token from `token_pool` (by default, one built
+    from the configured tokens) that has the most rate-limit budget left.
+    Calls go through a circuit breaker, with budgeted retries (and optional hedging)
+    for idempotent requests; each attempt is timed for the metrics endpoint.
+    Pass `transport` to swap the network for a local stand-in (tests, benchmarks).
+    """
+    return httpx.AsyncClient(
+        base_url=settings.github_api_url,
+        headers={"Accept": "application/vnd.github+json"},
+        auth=TokenPoolAuth(token_pool or create_token_pool(settings)),
+        transport=ResilientTransport(
+            InstrumentedTransport(transport or _network_transport(settings)),
+            breaker=CircuitBreaker(settings.breaker_failures, settings.breaker_reset),
+            budget=RetryBudget(settings.retry_budget),
+            retries=settings.retries,
+            backoff=settings.retry_backoff,
+            hedge=settings.hedge,
+        ),
+        timeout=_timeout(settings),
+    )
+
+
+def create_raw_client(settings: Settings, transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    """
+    Build the client that downloads raw gist content from gist.githubusercontent.com.
+    Kept apart from the API client: it sends no token, and the raw host's failures
+    never trip the API circuit breaker or spend its retry budget. Downloads are
+    streamed, so they are not retried either.
+    """
+    return httpx.AsyncClient(transport=transport or _network_transport(settings), timeout=_timeout(settings))
+
+
+def _network_transport(settings: Settings) -> httpx.AsyncBaseTransport:
+    return httpx.AsyncHTTPTransport(
+        http2=settings.http2,
+        limits=httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        ),
+    )
+
+
+def _timeout(settings: Settings) -> httpx.Timeout:
+    return httpx.Timeout(settings.read_timeout, connect=settings.connect_timeout, pool=settings.pool_timeout)
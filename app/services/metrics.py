@@ -0,0 +1,393 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms keep plain floats per label set, so recording
+on the hot path is a dict lookup and an addition. Values are per worker
+process and are not combined across workers: with several uvicorn workers
+behind one socket, each scrape reads whichever worker answers it.
+"""
+from abc import ABC, abstractmethod
+import asyncio
+from bisect import bisect_left
+from contextvars import ContextVar
+import functools
+import inspect
+import math
+import time
+from typing import Iterable
+
+from fastapi.routing import APIRoute
+import httpx
+
+# Seconds; covers cache hits (sub-ms) through upstream timeouts
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self): ...
+
+    @abstractmethod
+    def samples(self) -> Iterable[tuple[str, tuple[str, ...], tuple[str, ...], float]]: ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "", self.labelnames, values, child.value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self):
+        names = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                yield "_bucket", names, values + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, values, child.sum
+            yield "_count", self.labelnames, values, child.count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, extra: Iterable[Metric] = ()) -> str:
+        return "\n".join(m.render() for m in [*self._metrics, *extra]) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route template.", ("method", "route", "status")))
+HTTP_RESPONSE_SIZE = REGISTRY.register(Histogram(
+    "http_response_size_bytes", "Response body size, by route template.", ("method", "route"), SIZE_BUCKETS))
+GITHUB_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "github_request_duration_seconds", "Time to GitHub response headers, by status code or error.", ("status",)))
+GITHUB_IN_FLIGHT = REGISTRY.register(Gauge(
+    "github_requests_in_flight", "GitHub API requests currently awaiting a response."))
+GITHUB_CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "github_circuit_state", "GitHub circuit breaker state: 0 closed, 1 half-open, 2 open."))
+GITHUB_CIRCUIT_TRANSITIONS = REGISTRY.register(Counter(
+    "github_circuit_transitions_total", "GitHub circuit breaker state changes.", ("from_state", "to_state")))
+GITHUB_CIRCUIT_REJECTED = REGISTRY.register(Counter(
+    "github_circuit_rejected_total", "GitHub calls refused locally while the circuit was open."))
+GITHUB_RETRIES = REGISTRY.register(Counter(
+    "github_retries_total", "GitHub calls retried, by the failure that triggered the retry.", ("reason",)))
+GITHUB_RETRY_BUDGET_EXHAUSTED = REGISTRY.register(Counter(
+    "github_retry_budget_exhausted_total", "Retries or hedges skipped because the retry budget was spent."))
+GITHUB_HEDGES = REGISTRY.register(Counter(
+    "github_hedged_requests_total", "Hedged duplicate GitHub calls, by which attempt answered first.", ("winner",)))
+GIST_REFRESH_AHEAD = REGISTRY.register(Counter(
+    "gist_refresh_ahead_total", "Background refreshes of popular usernames, by outcome.", ("outcome",)))
+GIST_FILE_RESPONSES = REGISTRY.register(Counter(
+    "gist_file_responses_total", "Gist file responses, by where the body came from.", ("source",)))
+EVENT_LOOP_LAG = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a periodic timer."))
+PAGINATION_SIZE = REGISTRY.register(Histogram(
+    "pagination_page_size", "Requested page size on paginated gist listings.", (), COUNT_BUCKETS))
+PAGINATION_UPSTREAM_PAGES = REGISTRY.register(Histogram(
+    "pagination_upstream_pages", "GitHub pages needed to answer one paginated listing.", (), COUNT_BUCKETS))
+
+
+def gauges(prefix: str, documentation: str, values: dict[str, float]) -> list[Metric]:
+    """
+    One-off gauges for values that are read at scrape time (e.g. cache stats).
+    """
+    metrics = []
+    for key, value in values.items():
+        if isinstance(value, (int, float)):
+            gauge = Gauge(f"{prefix}_{key}", f"{documentation} ({key}).")
+            gauge.set(value)
+            metrics.append(gauge)
+    return metrics
+
+
+def token_gauges(pool_stats: dict) -> list[Metric]:
+    """
+    Per-token rate-limit budget gauges from TokenPool.stats().
+    """
+    remaining = Gauge("github_rate_limit_remaining", "Requests left in the token's rate-limit window.", ("token",))
+    limit = Gauge("github_rate_limit_limit", "Size of the token's rate-limit window.", ("token",))
+    reset = Gauge("github_rate_limit_reset_timestamp_seconds", "When the token's window resets.", ("token",))
+    rejected = Gauge("github_rate_limit_rejected", "Requests refused locally because every token was exhausted.")
+    rejected.set(pool_stats["rejected"])
+    for token in pool_stats["tokens"]:
+        if token["remaining"] is not None:
+            remaining.labels(token["token"]).set(token["remaining"])
+        if token["limit"] is not None:
+            limit.labels(token["token"]).set(token["limit"])
+        if token["reset_at"]:
+            reset.labels(token["token"]).set(token["reset_at"])
+    return [remaining, limit, reset, rejected]
+
+
+class Timings:
+    """
+    Per-request stage durations, emitted as a Server-Timing header when enabled.
+    `mark` is the perf_counter value the next route stage is measured from.
+    """
+    __slots__ = ("durations", "mark")
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+        self.mark = 0.0
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    def header(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.durations.items())
+
+
+request_timings: ContextVar[Timings | None] = ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, started: float) -> None:
+    """
+    Add the time since `started` (a perf_counter value) to the current request's timings, if any.
+    """
+    timings = request_timings.get()
+    if timings is not None:
+        timings.add(stage, time.perf_counter() - started)
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that splits request handling into validation (parameters and
+    dependencies), endpoint and serialize stages for Server-Timing. An endpoint
+    returning a pre-rendered Response times its rendering with record_stage("serialize").
+    Does nothing beyond one context lookup unless Server-Timing is enabled.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = self._timed(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _timed(endpoint):
+        # functools.wraps keeps the signature FastAPI reads parameters from
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kwargs):
+            timings = request_timings.get()
+            if timings is None:
+                return await endpoint(*args, **kwargs)
+            started = time.perf_counter()
+            timings.add("validation", started - timings.mark)
+            # Endpoints that render their own response record it as serialize, not endpoint
+            serialized = timings.durations.get("serialize", 0.0)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                timings.mark = time.perf_counter()
+                serialized = timings.durations.get("serialize", 0.0) - serialized
+                timings.add("endpoint", timings.mark - started - serialized)
+
+        return timed_endpoint
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            timings = request_timings.get()
+            if timings is None:
+                return await handler(request)
+            timings.mark = time.perf_counter()
+            response = await handler(request)
+            timings.add("serialize", time.perf_counter() - timings.mark)
+            return response
+
+        return timed_handler
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the real transport to time every GitHub call and track in-flight requests.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        GITHUB_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        except httpx.TimeoutException:
+            status = "timeout"
+            raise
+        finally:
+            GITHUB_IN_FLIGHT.dec()
+            GITHUB_REQUEST_DURATION.labels(status).observe(time.perf_counter() - started)
+            record_stage("upstream", started)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and response size per route template,
+    and optionally adding a Server-Timing header with the request's stage breakdown.
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = Timings() if self.server_timing else None
+        token = request_timings.set(timings)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    timings.add("total", time.perf_counter() - started)
+                    message.setdefault("headers", [])
+                    message["headers"] = [*message["headers"], (b"server-timing", timings.header().encode())]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_timings.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.labels(method, template, str(status)).observe(time.perf_counter() - started)
+            HTTP_RESPONSE_SIZE.labels(method, template).observe(size)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """
+    Sleep for `interval` in a loop and record how late each wake-up is.
+    Sustained lag means something is blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
@@ -0,0 +1,74 @@
+import heapq
+import math
+import time
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+# Rescale stored weights once they reach 2**_MAX_EXPONENT, well inside float range
+_MAX_EXPONENT = 64
+
+
+class DecayedCounter(Generic[K]):
+    """
+    Per-key request counts that halve every `half_life` seconds, for ranking keys
+    by recent popularity.
+
+    Uses forward decay: instead of decaying every score as time passes, a new hit
+    is weighted by 2 ** (elapsed / half_life) since a landmark time, so a hit is
+    O(1). Scores are rescaled to a new landmark when weights grow large. At most
+    `max_keys` keys are tracked; when full, the less popular half is dropped.
+    """
+
+    def __init__(
+        self,
+        half_life: float = 300.0,
+        max_keys: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        self._clock = clock
+        self._landmark = clock()
+        self._weights: dict[K, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    def hit(self, key: K, amount: float = 1.0) -> None:
+        exponent = (self._clock() - self._landmark) / self.half_life
+        if exponent > _MAX_EXPONENT:
+            self._rescale()
+            exponent = (self._clock() - self._landmark) / self.half_life
+        self._weights[key] = self._weights.get(key, 0.0) + amount * 2 ** exponent
+        if len(self._weights) > self.max_keys:
+            keep = heapq.nlargest(self.max_keys // 2, self._weights.items(), key=lambda item: item[1])
+            self._weights = dict(keep)
+
+    def discard(self, key: K) -> None:
+        """
+        Stop tracking `key`, e.g. once it no longer exists.
+        """
+        self._weights.pop(key, None)
+
+    def score(self, key: K) -> float:
+        """
+        Decayed hit count of `key` as of now.
+        """
+        return self._weights.get(key, 0.0) * self._decay()
+
+    def top(self, k: int, min_score: float = 0.0) -> list[tuple[K, float]]:
+        """
+        The `k` most popular keys with their scores, best first, skipping scores below `min_score`.
+        """
+        decay = self._decay()
+        best = heapq.nlargest(k, self._weights.items(), key=lambda item: item[1])
+        return [(key, weight * decay) for key, weight in best if weight * decay >= min_score]
+
+    def _decay(self) -> float:
+        return math.pow(2, -(self._clock() - self._landmark) / self.half_life)
+
+    def _rescale(self) -> None:
+        decay = self._decay()
+        self._weights = {key: weight * decay for key, weight in self._weights.items() if weight * decay > 1e-9}
+        self._landmark = self._clock()
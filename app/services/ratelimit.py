@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+import math
+import time
+from typing import Callable, Generator
+
+import httpx
+
+
+class RateLimitExhausted(Exception):
+    """
+    Raised instead of sending a request when every token in the pool is out of budget.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"GitHub rate limit budget exhausted; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class TokenBudget:
+    token: str | None
+    # Position in the pool; names the token in stats and metrics without revealing any of it
+    index: int = 0
+    limit: int | None = None
+    remaining: int | None = None
+    reset_at: float = 0.0
+    requests: int = 0
+
+    @property
+    def label(self) -> str:
+        return f"token-{self.index}" if self.token else "anonymous"
+
+
+class TokenPool:
+    """
+    Tracks the GitHub rate-limit budget of a set of tokens.
+
+    Each request is sent with the token that has the most remaining budget.
+    The budget is decremented optimistically when a token is handed out, then
+    corrected from the X-RateLimit-* headers of the response. A token whose
+    remaining budget is at or below `reserve` is skipped until its reset time.
+    """
+
+    def __init__(
+        self,
+        tokens: list[str | None],
+        reserve: int = 0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.budgets = [TokenBudget(token, index) for index, token in enumerate(tokens or [None])]
+        self.reserve = reserve
+        self._clock = clock
+        self.rejected = 0
+
+    def acquire(self) -> TokenBudget:
+        now = self._clock()
+        for budget in self.budgets:
+            if budget.remaining is not None and now >= budget.reset_at:
+                # Window rolled over; assume a full budget until headers say otherwise
+                budget.remaining = budget.limit
+        available = [b for b in self.budgets if b.remaining is None or b.remaining > self.reserve]
+        if not available:
+            self.rejected += 1
+            reset_at = min(b.reset_at for b in self.budgets)
+            raise RateLimitExhausted(max(1, math.ceil(reset_at - now)))
+
+        budget = max(available, key=lambda b: math.inf if b.remaining is None else b.remaining)
+        if budget.remaining is not None:
+            budget.remaining -= 1
+        budget.requests += 1
+        return budget
+
+    def available(self) -> float:
+        """
+        Requests left across the pool above the reserve; infinite while any token's budget is unknown.
+        """
+        now = self._clock()
+        total = 0
+        for budget in self.budgets:
+            remaining = budget.limit if budget.remaining is not None and now >= budget.reset_at else budget.remaining
+            if remaining is None:
+                return math.inf
+            total += max(0, remaining - self.reserve)
+        return total
+
+    def limit(self) -> float:
+        """
+        Size of the pool's rate-limit windows combined; infinite while any token's limit is unknown.
+        """
+        if any(budget.limit is None for budget in self.budgets):
+            return math.inf
+        return sum(budget.limit for budget in self.budgets)
+
+    def update(self, budget: TokenBudget, response: httpx.Response) -> None:
+        headers = response.headers
+        if "X-RateLimit-Remaining" not in headers:
+            if response.status_code == 304 and budget.remaining is not None:
+                # Conditional hits are free; give back the optimistic decrement
+                budget.remaining += 1
+            return
+        budget.remaining = int(headers["X-RateLimit-Remaining"])
+        if "X-RateLimit-Limit" in headers:
+            budget.limit = int(headers["X-RateLimit-Limit"])
+        if "X-RateLimit-Reset" in headers:
+            budget.reset_at = float(headers["X-RateLimit-Reset"])
+
+    def stats(self) -> dict:
+        return {
+            "rejected": self.rejected,
+            "tokens": [
+                {
+                    "token": b.label,
+                    "limit": b.limit,
+                    "remaining": b.remaining,
+                    "reset_at": b.reset_at or None,
+                    "requests": b.requests,
+                }
+                for b in self.budgets
+            ],
+        }
+
+
+class TokenPoolAuth(httpx.Auth):
+    """
+    httpx auth flow that signs each request with the pool's best token and
+    feeds the response's rate-limit headers back into the pool.
+    """
+
+    def __init__(self, pool: TokenPool):
+        self.pool = pool
+
+    def auth_flow(self, request: httpx.Request) -> Generator[httpx.Request, httpx.Response, None]:
+        budget = self.pool.acquire()
+        if budget.token:
+            request.headers["Authorization"] = f"token {budget.token}"
+        response = yield request
+        self.pool.update(budget, response)
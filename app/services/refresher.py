@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Iterable
+
+from fastapi import HTTPException
+
+from app.services.gists import GistService
+from app.services.metrics import GIST_REFRESH_AHEAD
+from app.services.ratelimit import TokenPool
+
+logger = logging.getLogger("uvicorn.error")
+
+# Usernames below this decayed score (about one request per half-life) are not worth refreshing
+_MIN_SCORE = 0.5
+
+# Never hold back more than this share of the pool's rate limit from refreshes,
+# so a small limit (60/hour without a token) does not pause them for good
+_MAX_RESERVED_SHARE = 0.5
+
+
+class RefreshScheduler:
+    """
+    Keeps the `top_k` most requested usernames warm, so their requests never wait on
+    GitHub when a cache entry expires.
+
+    Every `interval` seconds the hottest usernames (by GistService.popularity) are
+    refreshed if their first page would stop being fresh before the next pass.
+    Refreshes in a pass are spread across the interval with jitter rather than sent
+    at once, and are skipped while the token pool has fewer than `min_budget`
+    requests left (at most half its rate limit), leaving that budget to live traffic. `seed` usernames count as
+    requested once at startup, so they are loaded on the first pass. Usernames
+    GitHub no longer knows (404) are dropped from the ranking.
+    """
+
+    def __init__(
+        self,
+        service: GistService,
+        token_pool: TokenPool,
+        top_k: int = 50,
+        interval: float = 10.0,
+        seed: Iterable[str] = (),
+        min_budget: int = 500,
+    ):
+        self.service = service
+        self.token_pool = token_pool
+        self.top_k = top_k
+        self.interval = interval
+        self.min_budget = min_budget
+        self._paused = False
+        for username in seed:
+            service.popularity.hit(username.lower())
+
+    @property
+    def lead(self) -> float:
+        # Refresh anything that would go stale before the pass after next could catch it
+        return 2 * self.interval
+
+    async def run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.run_once()
+            except Exception:
+                # A bug or an unexpected failure must not stop refreshing for good
+                logger.exception("Refresh-ahead pass failed")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    @property
+    def budget_floor(self) -> float:
+        """
+        Requests left below which refreshes are skipped.
+        """
+        return min(self.min_budget, self.token_pool.limit() * _MAX_RESERVED_SHARE)
+
+    async def run_once(self) -> None:
+        """
+        One refresh pass over the current top usernames.
+        """
+        hot = self.service.popularity.top(self.top_k, min_score=_MIN_SCORE)
+        if not hot:
+            return
+        gap = self.interval / len(hot)
+        for username, _ in hot:
+            floor = self.budget_floor
+            if self.token_pool.available() < floor:
+                GIST_REFRESH_AHEAD.labels("skipped_budget").inc()
+                if not self._paused:
+                    logger.info(f"Refresh-ahead paused: under {floor:g} GitHub requests of budget left")
+                self._paused = True
+                return
+            if self._paused:
+                logger.info("Refresh-ahead resumed")
+            self._paused = False
+            try:
+                if not await self.service.refresh_ahead(username, self.lead):
+                    continue
+                GIST_REFRESH_AHEAD.labels("refreshed").inc()
+            except HTTPException as exc:
+                GIST_REFRESH_AHEAD.labels("failed").inc()
+                logger.warning(f"Refresh-ahead for '{username}' failed: {exc.status_code} {exc.detail}")
+                if exc.status_code == 404:
+                    # The user is gone; stop spending budget on them every pass
+                    self.service.popularity.discard(username)
+            # Only spend the gap after a GitHub call, so a pass of fresh users costs nothing
+            await asyncio.sleep(gap * random.uniform(0.5, 1.5))
@@ -0,0 +1,291 @@
+import asyncio
+from collections import deque
+from enum import Enum
+import logging
+import math
+import random
+import time
+from typing import Callable
+
+import httpx
+
+from app.services.metrics import (
+    GITHUB_CIRCUIT_REJECTED,
+    GITHUB_CIRCUIT_STATE,
+    GITHUB_CIRCUIT_TRANSITIONS,
+    GITHUB_HEDGES,
+    GITHUB_RETRIES,
+    GITHUB_RETRY_BUDGET_EXHAUSTED,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+# Methods that are safe to send twice
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Upstream answers worth another attempt; anything else (including 403/404) is final
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+# Failures where the request most likely never reached GitHub, or the connection
+# broke before an answer. Read timeouts are not retried: a slow upstream rarely
+# gets faster, and waiting out the timeout again only doubles the damage.
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadError, httpx.RemoteProtocolError)
+
+# Successful attempts remembered for the hedging latency threshold, and how many
+# are needed before hedging starts
+_LATENCY_WINDOW = 256
+_HEDGE_MIN_SAMPLES = 20
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker is open.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"GitHub circuit breaker is open; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CircuitState(Enum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker:
+    """
+    Stops calling GitHub after `failure_threshold` consecutive failures (5xx answers,
+    timeouts, connection errors). While open, calls fail immediately with CircuitOpen.
+    After `reset_timeout` seconds one probe call is let through (half-open): success
+    closes the circuit, failure opens it for another `reset_timeout`.
+    Transitions are logged and exported as metrics.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probing = False
+        GITHUB_CIRCUIT_STATE.set(self.state.value)
+
+    def before_call(self) -> None:
+        """
+        Raise CircuitOpen unless a call may go out now.
+        """
+        if self.state is CircuitState.OPEN:
+            if self._clock() - self.opened_at < self.reset_timeout:
+                self._reject()
+            self._transition(CircuitState.HALF_OPEN)
+        if self.state is CircuitState.HALF_OPEN:
+            if self._probing:
+                self._reject()
+            self._probing = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if self.state is not CircuitState.CLOSED:
+            self._transition(CircuitState.CLOSED)
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.failures += 1
+        if self.state is CircuitState.HALF_OPEN or (
+            self.state is CircuitState.CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.opened_at = self._clock()
+            self._transition(CircuitState.OPEN)
+
+    def release(self) -> None:
+        """
+        The call was abandoned (cancelled) without an outcome; let another probe through.
+        """
+        self._probing = False
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.opened_at + self.reset_timeout - self._clock()))
+
+    def stats(self) -> dict:
+        return {"state": self.state.name.lower(), "failures": self.failures, "rejected": self.rejected}
+
+    def _reject(self) -> None:
+        self.rejected += 1
+        GITHUB_CIRCUIT_REJECTED.inc()
+        raise CircuitOpen(self.retry_after())
+
+    def _transition(self, state: CircuitState) -> None:
+        reason = f" after {self.failures} consecutive failures" if state is CircuitState.OPEN else ""
+        logger.warning(f"GitHub circuit breaker {self.state.name.lower()} -> {state.name.lower()}{reason}")
+        GITHUB_CIRCUIT_TRANSITIONS.labels(self.state.name.lower(), state.name.lower()).inc()
+        GITHUB_CIRCUIT_STATE.set(state.value)
+        self.state = state
+
+
+class RetryBudget:
+    """
+    Caps retries (and hedges) at a fraction of regular traffic, so retries cannot
+    multiply load on an upstream that is already struggling. Every request deposits
+    `ratio` tokens, every retry spends one; at most `max_tokens` are banked.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            GITHUB_RETRY_BUDGET_EXHAUSTED.inc()
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    """
+    Recent latencies of successful calls, for the hedging threshold.
+    The percentile is recomputed at most every 16 samples.
+    """
+
+    def __init__(self, window: int = _LATENCY_WINDOW):
+        self.samples: deque[float] = deque(maxlen=window)
+        self._cached: dict[float, float] = {}
+        self._since_sort = 0
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self._since_sort += 1
+        if self._since_sort >= 16:
+            self._cached.clear()
+            self._since_sort = 0
+
+    def percentile(self, pct: float) -> float | None:
+        if len(self.samples) < _HEDGE_MIN_SAMPLES:
+            return None
+        if pct not in self._cached:
+            ordered = sorted(self.samples)
+            self._cached[pct] = ordered[min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1)]
+        return self._cached[pct]
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the real transport with a circuit breaker, budgeted retries with jittered
+    exponential backoff for idempotent requests, and optional hedging: when a call
+    is still unanswered after the recent p95 latency, a duplicate is sent and the
+    first answer wins.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        breaker: CircuitBreaker | None = None,
+        budget: RetryBudget | None = None,
+        retries: int = 2,
+        backoff: float = 0.1,
+        max_backoff: float = 2.0,
+        hedge: bool = False,
+    ):
+        self.transport = transport
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.latency = LatencyTracker()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method not in IDEMPOTENT_METHODS:
+            return await self._attempt(request)
+
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = await (self._hedged(request) if self.hedge else self._attempt(request))
+            except RETRY_ERRORS as exc:
+                if attempt >= self.retries or not self.budget.withdraw():
+                    raise
+                reason = type(exc).__name__
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries or not self.budget.withdraw():
+                    return response
+                await response.aclose()
+                reason = str(response.status_code)
+
+            attempt += 1
+            GITHUB_RETRIES.labels(reason).inc()
+            # Full jitter, so retries from many requests do not arrive in lockstep
+            await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))))
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    async def _attempt(self, request: httpx.Request) -> httpx.Response:
+        self.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+            self.latency.observe(time.perf_counter() - started)
+        return response
+
+    async def _hedged(self, request: httpx.Request) -> httpx.Response:
+        delay = self.latency.percentile(95)
+        if delay is None:
+            return await self._attempt(request)
+
+        primary = asyncio.ensure_future(self._attempt(request))
+        tasks = [primary]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self.budget.withdraw():
+                winner = primary
+                return await primary
+
+            hedge = asyncio.ensure_future(self._attempt(request))
+            tasks.append(hedge)
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        GITHUB_HEDGES.labels("hedge" if task is hedge else "primary").inc()
+                        return task.result()
+                    if error is None or isinstance(error, CircuitOpen):
+                        # Prefer an upstream error over the hedge being refused by the breaker
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await task.result().aclose()
@@ -0,0 +1,176 @@
+from bisect import bisect_left, insort
+import re
+from typing import Iterable, Literal
+
+from app.schemas.gists import Gist
+
+SortField = Literal["updated", "created"]
+
+_WORD = re.compile(r"[^\W_]+")
+_EMPTY: frozenset[str] = frozenset()
+
+# Below this share of the index, sorting the matches beats scanning a whole ordering
+_SORT_MATCHES_RATIO = 0.25
+
+
+def tokenize(text: str | None) -> set[str]:
+    """
+    Lowercased words of `text`; punctuation, underscores and dots separate words,
+    so "hello_world.py" gives {"hello", "world", "py"}.
+    """
+    return set(_WORD.findall(text.casefold())) if text else set()
+
+
+def _terms(gist: Gist) -> set[str]:
+    terms = tokenize(gist.description)
+    for name in gist.files:
+        terms |= tokenize(name)
+    return terms
+
+
+def _languages(gist: Gist) -> set[str]:
+    return {file.language.casefold() for file in gist.files.values() if file.language}
+
+
+class GistIndex:
+    """
+    Search index over one user's gists, kept per upstream page so only pages
+    whose version (ETag) changed are re-indexed.
+
+    Holds an inverted index from description and filename words to gist ids,
+    sets of gist ids per file language and per visibility, and arrays of
+    (timestamp, id) kept sorted for the created and updated dates. A query
+    intersects the smallest sets first, then orders the matches either by
+    sorting them by rank, when few, or by scanning the relevant ordering.
+    Orderings and ranks are derived on first use after a change.
+    """
+
+    def __init__(self):
+        self._versions: dict[int, str | None] = {}
+        self._pages: dict[int, list[str]] = {}
+        self._docs: dict[str, Gist] = {}
+        # Where each gist was listed: (page number, position), for the upstream order
+        self._positions: dict[str, tuple[int, int]] = {}
+        self._words: dict[str, set[str]] = {}
+        self._languages: dict[str, set[str]] = {}
+        self._public: set[str] = set()
+        self._secret: set[str] = set()
+        self._created: list[tuple[str, str]] = []
+        self._updated: list[tuple[str, str]] = []
+        self._orders: dict[SortField | None, tuple[list[str], dict[str, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def update(self, number: int, gists: list[Gist], version: str | None = None) -> bool:
+        """
+        Index upstream page `number`, replacing what it held before, unless it is
+        unchanged since the last update (same non-None `version`). Returns whether
+        the index changed.
+        """
+        if version is not None and self._versions.get(number) == version:
+            return False
+        self._drop_page(number)
+        for position, gist in enumerate(gists):
+            if gist.id in self._docs:
+                # Moved here from another page (e.g. recently updated); the newer listing wins
+                self._remove(gist.id)
+            self._add(gist, (number, position))
+        self._pages[number] = [gist.id for gist in gists]
+        self._versions[number] = version
+        self._orders.clear()
+        return True
+
+    def truncate(self, pages: int) -> None:
+        """
+        Forget pages past `pages`, after the user's listing got shorter.
+        """
+        for number in [n for n in self._pages if n > pages]:
+            self._drop_page(number)
+            self._orders.clear()
+
+    def query(
+        self,
+        q: str | None = None,
+        language: str | None = None,
+        public: bool | None = None,
+        sort: SortField | None = None,
+    ) -> list[Gist]:
+        """
+        Gists containing every word of `q` (in their description or a filename), with a
+        file in `language`, and the given visibility. Ordered newest first by `sort`,
+        or as GitHub listed them when `sort` is None. A `q` without any word matches nothing.
+        """
+        sets: list[set[str] | frozenset[str]] = []
+        if q:
+            words = tokenize(q)
+            if not words:
+                return []
+            sets.extend(self._words.get(word, _EMPTY) for word in words)
+        if language:
+            sets.append(self._languages.get(language.casefold(), _EMPTY))
+        if public is not None:
+            sets.append(self._public if public else self._secret)
+
+        matches: set[str] | frozenset[str] | None = None
+        if sets:
+            sets.sort(key=len)
+            matches = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+
+        order, rank = self._ordering(sort)
+        if matches is None:
+            ids: Iterable[str] = order
+        elif len(matches) < len(order) * _SORT_MATCHES_RATIO:
+            ids = sorted(matches, key=rank.__getitem__)
+        else:
+            ids = [id for id in order if id in matches]
+        return list(map(self._docs.__getitem__, ids))
+
+    def _ordering(self, sort: SortField | None) -> tuple[list[str], dict[str, int]]:
+        """
+        Every gist id in `sort` order (newest first, or as listed), and each id's rank in it.
+        """
+        if sort not in self._orders:
+            if sort is not None:
+                dates = self._created if sort == "created" else self._updated
+                order = [id for _, id in reversed(dates)]
+            else:
+                order = [
+                    id
+                    for number in sorted(self._pages)
+                    for position, id in enumerate(self._pages[number])
+                    if self._positions.get(id) == (number, position)
+                ]
+            self._orders[sort] = order, {id: i for i, id in enumerate(order)}
+        return self._orders[sort]
+
+    def _drop_page(self, number: int) -> None:
+        self._versions.pop(number, None)
+        for position, id in enumerate(self._pages.pop(number, ())):
+            if self._positions.get(id) == (number, position):
+                self._remove(id)
+
+    def _add(self, gist: Gist, position: tuple[int, int]) -> None:
+        self._docs[gist.id] = gist
+        self._positions[gist.id] = position
+        for word in _terms(gist):
+            self._words.setdefault(word, set()).add(gist.id)
+        for language in _languages(gist):
+            self._languages.setdefault(language, set()).add(gist.id)
+        (self._public if gist.public else self._secret).add(gist.id)
+        insort(self._created, (gist.created_at or "", gist.id))
+        insort(self._updated, (gist.updated_at or "", gist.id))
+
+    def _remove(self, id: str) -> None:
+        gist = self._docs.pop(id)
+        del self._positions[id]
+        for index, keys in ((self._words, _terms(gist)), (self._languages, _languages(gist))):
+            for key in keys:
+                ids = index[key]
+                ids.discard(id)
+                if not ids:
+                    del index[key]
+        self._public.discard(id)
+        self._secret.discard(id)
+        for dates, value in ((self._created, gist.created_at), (self._updated, gist.updated_at)):
+            del dates[bisect_left(dates, (value or "", id))]
@@ -0,0 +1,266 @@
+from contextlib import contextmanager
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Generic, Hashable, TypeVar
+
+from app.services.cache import CacheLookup, CacheState, state_for_age
+
+V = TypeVar("V")
+T = TypeVar("T")
+
+logger = logging.getLogger("uvicorn.error")
+
+# Refresh an entry's LRU timestamp at most this often, to keep reads mostly read-only
+_TOUCH_INTERVAL = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET entries = entries - 1, bytes = bytes - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size + NEW.size;
+END;
+"""
+
+
+def _key(key: Hashable) -> str:
+    if isinstance(key, tuple):
+        return "\x1f".join(str(part) for part in key)
+    return str(key)
+
+
+class SQLiteCache(Generic[V]):
+    """
+    Cache backend stored in a SQLite database in WAL mode, shared by every
+    worker process on the host and kept across restarts.
+
+    Same semantics as TTLCache (fresh / stale / expired, LRU eviction by entry
+    count and total size), using wall-clock time so ages agree between processes.
+    Values are stored as bytes via `dumps`/`loads`. Each write is a single
+    transaction, so concurrent readers never see a partially written entry.
+    Entry and byte totals are kept by triggers, so bounds checks never scan the table.
+    Hit/miss counters are per process.
+
+    Calls do blocking I/O (`blocking`), so async callers should run them in a
+    thread. Calls may come from several threads at once: one lock guards the
+    connection, the counters and the pending LRU timestamps. Reads never
+    write: LRU timestamps of read entries are written with this process's next
+    write. Writes wait at most `busy_timeout` seconds for another worker's write
+    lock. A failed read counts as a miss and a failed write is skipped, so the
+    cache never fails a request.
+    """
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        dumps: Callable[[V], bytes],
+        loads: Callable[[bytes], V],
+        ttl: float,
+        stale_ttl: float = 0.0,
+        max_entries: int = 1024,
+        max_bytes: int = 32 * 1024 * 1024,
+        clock: Callable[[], float] = time.time,
+        busy_timeout: float = 0.25,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._dumps = dumps
+        self._loads = loads
+        self._clock = clock
+        # Autocommit mode; writes open their own IMMEDIATE transactions
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL stays consistent on crash and skips an fsync per commit
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        # Setup may wait for other workers; after that a busy write is skipped quickly
+        self._db.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+        # Keys read since the last write, with when, for their LRU timestamps
+        self._touched: dict[str, float] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+
+    def __len__(self) -> int:
+        totals = self._read(self._totals)
+        return totals[0] if totals else 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        row = self._read(lambda: self._db.execute("SELECT 1 FROM entries WHERE key = ?", (_key(key),)).fetchone())
+        return bool(row)
+
+    def get(self, key: Hashable) -> CacheLookup[V]:
+        k = _key(key)
+        row = self._read(lambda: self._db.execute(
+            "SELECT value, stored_at, accessed_at FROM entries WHERE key = ?", (k,)
+        ).fetchone())
+        value = self._decode(row)
+        now = self._clock()
+        # Counters and pending touches are shared with other threads' calls
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return CacheLookup(CacheState.MISS)
+
+            _, stored_at, accessed_at = row
+            if now - accessed_at > _TOUCH_INTERVAL:
+                self._touched[k] = now
+
+            age = now - stored_at
+            if age > self.ttl + self.stale_ttl:
+                self.expirations += 1
+                self.misses += 1
+                return CacheLookup(CacheState.EXPIRED, value)
+            if age > self.ttl:
+                self.stale_hits += 1
+                return CacheLookup(CacheState.STALE, value)
+            self.hits += 1
+            return CacheLookup(CacheState.FRESH, value)
+
+    def peek(self, key: Hashable) -> CacheLookup[V]:
+        """
+        Like get(), plus the entry's age, without counting it or touching its LRU timestamp.
+        """
+        row = self._read(lambda: self._db.execute(
+            "SELECT value, stored_at FROM entries WHERE key = ?", (_key(key),)
+        ).fetchone())
+        value = self._decode(row)
+        if value is None:
+            return CacheLookup(CacheState.MISS)
+        age = self._clock() - row[1]
+        return CacheLookup(state_for_age(age, self.ttl, self.stale_ttl), value, age)
+
+    def set(self, key: Hashable, value: V, size: int) -> None:
+        blob = self._dumps(value)
+        # Account for what is actually stored, not the in-memory estimate
+        size = len(blob)
+        if size > self.max_bytes:
+            self.delete(key)
+            return
+        now = self._clock()
+
+        def write() -> None:
+            with self._transaction():
+                self._flush_touched()
+                self._db.execute(
+                    "INSERT INTO entries (key, value, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                    "stored_at = excluded.stored_at, accessed_at = excluded.accessed_at",
+                    (_key(key), blob, size, now, now),
+                )
+                self._evict()
+            self._touched.clear()
+
+        self._write(write)
+
+    def delete(self, key: Hashable) -> None:
+        self._write(lambda: self._db.execute("DELETE FROM entries WHERE key = ?", (_key(key),)))
+
+    def clear(self) -> None:
+        self._write(lambda: self._db.execute("DELETE FROM entries"))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> dict[str, int]:
+        totals = self._read(self._totals)
+        return {
+            # Omitted when the database cannot be read
+            **({"entries": totals[0], "bytes": totals[1]} if totals else {}),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "errors": self.errors,
+        }
+
+    def _read(self, query: Callable[[], T]) -> T | None:
+        with self._lock:
+            try:
+                return query()
+            except sqlite3.Error as exc:
+                self.errors += 1
+                logger.warning(f"Gist cache read failed, treating as a miss: {exc}")
+                return None
+
+    def _write(self, statement: Callable[[], object]) -> None:
+        with self._lock:
+            try:
+                statement()
+            except sqlite3.Error as exc:
+                # Typically another worker holding the write lock past busy_timeout
+                self.errors += 1
+                logger.warning(f"Gist cache write skipped: {exc}")
+
+    def _decode(self, row: tuple | None) -> V | None:
+        if row is None:
+            return None
+        try:
+            return self._loads(row[0])
+        except Exception:
+            # Written by an incompatible version; treat as absent until overwritten
+            return None
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self._db.executemany(
+                "UPDATE entries SET accessed_at = ? WHERE key = ? AND accessed_at < ?",
+                [(at, k, at) for k, at in self._touched.items()],
+            )
+
+    def _totals(self) -> tuple[int, int]:
+        return self._db.execute("SELECT entries, bytes FROM totals").fetchone()
+
+    def _evict(self) -> None:
+        while True:
+            entries, total_bytes = self._totals()
+            if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                return
+            # Drop the least recently used entries; one at a time when over the byte limit
+            batch = max(1, entries - self.max_entries) if total_bytes <= self.max_bytes else 1
+            cursor = self._db.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (batch,),
+            )
+            self.evictions += cursor.rowcount
+
+    @contextmanager
+    def _transaction(self):
+        # Take the write lock up front so workers never deadlock upgrading read locks
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
@@ -0,0 +1,180 @@
+"""
+Local stand-in for the GitHub gists API, used by the benchmark harness.
+
+Serves `GET /users/{username}/gists` with GitHub-style pagination (`page`,
+`per_page`, `Link`), ETag / If-None-Match revalidation and X-RateLimit-*
+headers. Latency, page counts, payload sizes, the rate-limit budget and
+injected failures are configured through FAKE_GITHUB_* environment variables
+(see FakeGitHubConfig). `GET /_stats` reports how many responses of each kind
+were served and `POST /_reset` zeroes the counters and the rate-limit budget.
+
+Usernames starting with `missing` get a 404 and ones starting with `empty`
+have no gists.
+"""
+import asyncio
+from collections import Counter
+from dataclasses import asdict, dataclass, fields
+from functools import lru_cache
+import hashlib
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request, Response
+
+MAX_PER_PAGE = 100
+
+
+@dataclass(frozen=True)
+class FakeGitHubConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    gists_per_user: int = 30
+    # Approximate JSON size of each gist in a listing
+    payload_bytes: int = 1000
+    # Requests allowed per window; 0 disables rate limiting
+    rate_limit: int = 0
+    rate_limit_window: int = 3600
+    # Fraction of requests answered with `error_status`
+    error_rate: float = 0.0
+    error_status: int = 502
+    # Fraction of requests that stall for `timeout_s` before answering
+    timeout_rate: float = 0.0
+    timeout_s: float = 30.0
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeGitHubConfig":
+        values = {}
+        for f in fields(cls):
+            raw = os.getenv(f"FAKE_GITHUB_{f.name.upper()}")
+            if raw is not None:
+                values[f.name] = type(f.default)(raw)
+        return cls(**values)
+
+    def to_env(self) -> dict[str, str]:
+        return {f"FAKE_GITHUB_{name.upper()}": str(value) for name, value in asdict(self).items()}
+
+
+def _gist(username: str, index: int, payload_bytes: int) -> dict:
+    gist_id = hashlib.sha1(f"{username}/{index}".encode()).hexdigest()[:20]
+    gist = {
+        "url": f"https://api.github.com/gists/{gist_id}",
+        "id": gist_id,
+        "html_url": f"https://gist.github.com/{username}/{gist_id}",
+        "description": f"Gist {index} of {username}",
+        "public": True,
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": "2024-06-01T00:00:00Z",
+        "files": {
+            f"file{index}.py": {
+                "filename": f"file{index}.py",
+                "type": "application/x-python",
+                "language": "Python",
+                "raw_url": f"https://gist.githubusercontent.com/{username}/{gist_id}/raw/file{index}.py",
+                "size": 120,
+            }
+        },
+        "owner": {"login": username, "id": 1, "type": "User", "site_admin": False},
+        "comments": 0,
+        "truncated": False,
+    }
+    filler = payload_bytes - len(json.dumps(gist))
+    if filler > 0:
+        gist["files"][f"file{index}.py"]["x_padding"] = "x" * filler
+    return gist
+
+
+def create_app(config: FakeGitHubConfig) -> FastAPI:
+    app = FastAPI(title="Fake GitHub API")
+    rng = random.Random(config.seed)
+    counts: Counter[str] = Counter()
+    budget = {"used": 0, "reset_at": int(time.time()) + config.rate_limit_window}
+
+    @lru_cache(maxsize=4096)
+    def page_body(username: str, page: int, per_page: int) -> tuple[bytes, str]:
+        start = (page - 1) * per_page
+        end = min(start + per_page, config.gists_per_user)
+        body = json.dumps([_gist(username, i, config.payload_bytes) for i in range(start, end)]).encode()
+        return body, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    def rate_headers() -> dict[str, str]:
+        if not config.rate_limit:
+            return {}
+        now = time.time()
+        if now >= budget["reset_at"]:
+            budget["used"] = 0
+            budget["reset_at"] = int(now) + config.rate_limit_window
+        return {
+            "X-RateLimit-Limit": str(config.rate_limit),
+            "X-RateLimit-Remaining": str(max(0, config.rate_limit - budget["used"])),
+            "X-RateLimit-Reset": str(budget["reset_at"]),
+        }
+
+    @app.get("/users/{username}/gists")
+    async def list_gists(username: str, request: Request, page: int = 1, per_page: int = 30):
+        counts["requests"] += 1
+        delay = config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)
+        if config.timeout_rate and rng.random() < config.timeout_rate:
+            counts["timeouts"] += 1
+            delay = config.timeout_s * 1000
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if config.error_rate and rng.random() < config.error_rate:
+            counts["errors"] += 1
+            return Response(status_code=config.error_status, content=b'{"message": "Injected failure"}')
+
+        headers = rate_headers()
+        if config.rate_limit and budget["used"] >= config.rate_limit:
+            counts["rate_limited"] += 1
+            return Response(status_code=403, content=b'{"message": "API rate limit exceeded"}', headers=headers)
+
+        if username.startswith("missing"):
+            counts["not_found"] += 1
+            return Response(status_code=404, content=b'{"message": "Not Found"}', headers=headers)
+
+        total = 0 if username.startswith("empty") else config.gists_per_user
+        per_page = max(1, min(per_page, MAX_PER_PAGE))
+        last = max(1, -(-total // per_page))
+        body, etag = page_body(username, page, per_page) if total else (b"[]", '"empty"')
+        headers["ETag"] = etag
+
+        if request.headers.get("If-None-Match") == etag:
+            # Conditional hits are free on GitHub too
+            counts["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+        if config.rate_limit:
+            budget["used"] += 1
+            headers.update(rate_headers())
+
+        base = str(request.url.remove_query_params(["page", "per_page"]))
+        links = []
+        if page < last:
+            links.append(f'<{base}?page={page + 1}&per_page={per_page}>; rel="next"')
+            links.append(f'<{base}?page={last}&per_page={per_page}>; rel="last"')
+        if page > 1:
+            links.append(f'<{base}?page=1&per_page={per_page}>; rel="first"')
+            links.append(f'<{base}?page={page - 1}&per_page={per_page}>; rel="prev"')
+        if links:
+            headers["Link"] = ", ".join(links)
+
+        counts["full"] += 1
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(counts)
+
+    @app.post("/_reset")
+    async def reset():
+        counts.clear()
+        budget["used"] = 0
+        return Response(status_code=204)
+
+    return app
+
+
+app = create_app(FakeGitHubConfig.from_env())
@@ -0,0 +1,263 @@
+"""
+Load-test harness for the gists service.
+
+Starts the fake GitHub API (benchmarks.fake_github) and the real app under
+uvicorn with N workers, drives the app with a concurrent load generator and
+prints a JSON report: requests/sec, latency percentiles, status counts,
+upstream call counts and peak RSS of the app processes.
+
+    python -m benchmarks.run --workers 2 --concurrency 64 --requests 5000 \\
+        --users 50 --fake-latency-ms 80 --output bench.json
+
+Anything after `--env` is passed to the app as environment variables,
+e.g. `--env GIST_CACHE_TTL=0 GIST_CACHE_BACKEND=sqlite`.
+"""
+import argparse
+import asyncio
+from collections import Counter
+from dataclasses import asdict
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_github import FakeGitHubConfig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 2) if value is not None else None
+
+
+def _descendants(pid: int) -> list[int]:
+    pids = [pid]
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                for child in f.read().split():
+                    pids.extend(_descendants(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def peak_rss_mb(pid: int) -> dict | None:
+    """
+    Peak resident set size (VmHWM) of a process tree, from /proc. None where /proc is unavailable.
+    """
+    peaks = {}
+    for p in _descendants(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peaks[p] = int(line.split()[1]) / 1024
+        except OSError:
+            continue
+    if not peaks:
+        return None
+    return {"max_process": round(max(peaks.values()), 1), "total": round(sum(peaks.values()), 1), "processes": len(peaks)}
+
+
+def start_server(target: str, port: int, workers: int, env: dict[str, str]) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "uvicorn", target,
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ]
+    return subprocess.Popen(cmd, cwd=ROOT, env={**os.environ, **env})
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+async def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Server for {url} exited with {proc.returncode}")
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"Server for {url} not ready after {timeout}s")
+
+
+async def generate_load(
+    base_url: str,
+    paths: list[str],
+    concurrency: int,
+    timeout: float,
+) -> tuple[list[float], Counter, float]:
+    """
+    Send every path in `paths` with `concurrency` parallel connections.
+    Returns latencies (ms), status counts and the wall-clock duration.
+    """
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    queue = iter(paths)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            for path in queue:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    await response.aread()
+                    statuses[str(response.status_code)] += 1
+                except httpx.HTTPError as exc:
+                    statuses[type(exc).__name__] += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+    return latencies, statuses, duration
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    fake = FakeGitHubConfig(
+        latency_ms=args.fake_latency_ms,
+        jitter_ms=args.fake_jitter_ms,
+        gists_per_user=args.fake_gists,
+        payload_bytes=args.fake_payload_bytes,
+        rate_limit=args.fake_rate_limit,
+        error_rate=args.fake_error_rate,
+        timeout_rate=args.fake_timeout_rate,
+        seed=args.seed,
+    )
+    fake_port, app_port = free_port(), free_port()
+    fake_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+    app_env = {"GITHUB_API_URL": fake_url, "GITHUB_HTTP2": "false", **dict(e.split("=", 1) for e in args.env)}
+
+    rng = random.Random(args.seed)
+    usernames = [f"user{i}" for i in range(args.users)]
+    paths = [args.path.format(username=rng.choice(usernames)) for _ in range(args.warmup + args.requests)]
+
+    fake_proc = start_server("benchmarks.fake_github:app", fake_port, 1, fake.to_env())
+    app_proc = start_server("app.main:app", app_port, args.workers, app_env)
+    try:
+        await wait_ready(f"{fake_url}/_stats", fake_proc)
+        await wait_ready(f"{app_url}/", app_proc)
+
+        if args.warmup:
+            await generate_load(app_url, paths[:args.warmup], args.concurrency, args.timeout)
+        async with httpx.AsyncClient() as client:
+            await client.post(f"{fake_url}/_reset")
+
+        latencies, statuses, duration = await generate_load(
+            app_url, paths[args.warmup:], args.concurrency, args.timeout
+        )
+        async with httpx.AsyncClient() as client:
+            upstream = (await client.get(f"{fake_url}/_stats")).json()
+        rss = peak_rss_mb(app_proc.pid)
+    finally:
+        stop_server(app_proc)
+        stop_server(fake_proc)
+
+    latencies.sort()
+    return {
+        "commit": _git_commit(),
+        "config": {
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "users": args.users,
+            "path": args.path,
+            "app_env": app_env,
+            "fake_github": asdict(fake),
+        },
+        "duration_s": round(duration, 3),
+        "requests_per_sec": round(len(latencies) / duration, 1) if duration else None,
+        "latency_ms": {
+            "mean": _round(sum(latencies) / len(latencies) if latencies else None),
+            "p50": _round(percentile(latencies, 50)),
+            "p95": _round(percentile(latencies, 95)),
+            "p99": _round(percentile(latencies, 99)),
+            "max": _round(latencies[-1] if latencies else None),
+        },
+        "statuses": dict(statuses),
+        "upstream": upstream,
+        "upstream_calls_per_request": round(upstream.get("requests", 0) / len(latencies), 3) if latencies else None,
+        "peak_rss_mb": rss,
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    parser.add_argument("--concurrency", type=int, default=32, help="parallel client connections")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests sent first")
+    parser.add_argument("--users", type=int, default=20, help="distinct usernames to spread load over")
+    parser.add_argument("--path", default="/{username}", help="request path template")
+    parser.add_argument("--timeout", type=float, default=30.0, help="client timeout (seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake-latency-ms", type=float, default=50.0)
+    parser.add_argument("--fake-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--fake-gists", type=int, default=30, help="gists per user")
+    parser.add_argument("--fake-payload-bytes", type=int, default=1000, help="approximate JSON bytes per gist")
+    parser.add_argument("--fake-rate-limit", type=int, default=0, help="upstream requests per hour; 0 = unlimited")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0)
+    parser.add_argument("--fake-timeout-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE", help="extra app environment")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
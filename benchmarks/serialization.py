@@ -0,0 +1,105 @@
+"""
+Micro-benchmark of the GET /{username} CPU path: turning a GitHub listing into
+gists (summaries plus the fields search uses), and a page of them into the
+response body.
+
+Compares the service's pipeline against the previous one (`response.json()`,
+one `GistSummary(...)` per gist, `create_page`, then FastAPI validating and
+encoding the page against `response_model`) on fake-GitHub payloads, and
+prints a JSON report of microseconds per call and the speedup.
+
+    python -m benchmarks.serialization --gists 100 --size 50 --payload-bytes 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi.routing import serialize_response
+from fastapi_pagination import Page, Params, create_page
+from fastapi_pagination.api import set_page, set_params
+
+from app.api.routes import _page_json, router
+from app.schemas.gists import GIST_SUMMARIES, GISTS, Gist, GistSummary
+from benchmarks.fake_github import _gist
+
+
+def legacy_parse(body: bytes) -> list[GistSummary]:
+    return [
+        GistSummary(id=gist.get("id"), html_url=gist.get("html_url"), description=gist.get("description"))
+        for gist in json.loads(body)
+    ]
+
+
+def parse(body: bytes) -> list[Gist]:
+    return GISTS.validate_json(body)
+
+
+async def legacy_render(items: list[GistSummary], total: int, params: Params) -> bytes:
+    route = next(r for r in router.routes if getattr(r, "path", None) == "/{username}")
+    with set_page(Page), set_params(params):
+        page = create_page(items, total=total, params=params)
+    return await serialize_response(field=route.response_field, response_content=page, dump_json=True)
+
+
+def render(items: list[GistSummary], total: int, params: Params) -> bytes:
+    return _page_json(items, total, params)
+
+
+def per_call_us(fn, rounds: int) -> float:
+    """
+    Best of five timings of `rounds` calls, in microseconds per call.
+    """
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return best / rounds * 1e6
+
+
+def run(args: argparse.Namespace) -> dict:
+    body = json.dumps([_gist("octocat", i, args.payload_bytes) for i in range(args.gists)]).encode()
+    items = parse(body)[:args.size]
+    params = Params(page=1, size=args.size)
+    loop = asyncio.new_event_loop()
+
+    if GIST_SUMMARIES.dump_json(parse(body)) != GIST_SUMMARIES.dump_json(legacy_parse(body)):
+        raise AssertionError("parsed summaries differ")
+    if render(items, args.gists, params) != loop.run_until_complete(legacy_render(items, args.gists, params)):
+        raise AssertionError("rendered pages differ")
+
+    timings = {
+        "parse": (per_call_us(lambda: legacy_parse(body), args.rounds), per_call_us(lambda: parse(body), args.rounds)),
+        "render": (
+            per_call_us(lambda: loop.run_until_complete(legacy_render(items, args.gists, params)), args.rounds),
+            per_call_us(lambda: render(items, args.gists, params), args.rounds),
+        ),
+    }
+    loop.close()
+    return {
+        "config": vars(args),
+        "upstream_page_bytes": len(body),
+        "us_per_call": {
+            stage: {"legacy": round(legacy, 1), "current": round(current, 1), "speedup": round(legacy / current, 2)}
+            for stage, (legacy, current) in timings.items()
+        },
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gists", type=int, default=100, help="gists in the upstream page (GitHub max is 100)")
+    parser.add_argument("--size", type=int, default=50, help="gists in the rendered response page")
+    parser.add_argument("--payload-bytes", type=int, default=1000, help="approximate JSON bytes per upstream gist")
+    parser.add_argument("--rounds", type=int, default=500, help="calls per timing")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    print(json.dumps(run(parse_args(argv)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
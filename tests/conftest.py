@@ -0,0 +1,69 @@
+import httpx
+import pytest
+
+from app.config import Settings
+from app.services.cache import CacheBackend, TTLCache
+from app.services.gists import GistService
+from app.services.github import create_http_client
+from app.services.ratelimit import TokenPool
+
+
+class FakeClock:
+    """
+    Clock for time-dependent code; tests move `now` by hand.
+    """
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def anyio_backend():
+    # The service schedules work with asyncio tasks
+    return "asyncio"
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def github_service():
+    """
+    Builds GistServices over a local stand-in for GitHub. Call it with a handler
+    taking an httpx.Request and returning an httpx.Response (or awaitable), and
+    optionally a cache (by default TTLCache(ttl=60)), Settings and a TokenPool.
+    Requests are answered by the latest handler and recorded on `.calls`;
+    `.transport` lets other clients (e.g. for raw files) use the same stand-in.
+    """
+    calls: list[httpx.Request] = []
+    handlers = []
+    caches: list[CacheBackend] = []
+
+    def record(request: httpx.Request):
+        calls.append(request)
+        return handlers[-1](request)
+
+    transport = httpx.MockTransport(record)
+
+    def make(
+        handler,
+        cache: CacheBackend | None = None,
+        settings: Settings | None = None,
+        token_pool: TokenPool | None = None,
+    ) -> GistService:
+        handlers.append(handler)
+        client = create_http_client(settings or Settings(github_token=None), transport=transport, token_pool=token_pool)
+        caches.append(cache if cache is not None else TTLCache(ttl=60))
+        return GistService(client, caches[-1])
+
+    make.calls = calls
+    make.transport = transport
+    yield make
+    # Clients over a MockTransport hold no connections; a cache may hold a database
+    for cache in caches:
+        cache.close()
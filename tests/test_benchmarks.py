@@ -0,0 +1,82 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import Settings
+from app.services.cache import TTLCache
+from app.services.gists import GistService
+from app.services.github import create_http_client
+from benchmarks.fake_github import FakeGitHubConfig, create_app
+from benchmarks.run import percentile
+from benchmarks.serialization import parse_args, run
+
+
+def test_fake_github_paginates_with_link_headers():
+    fake = TestClient(create_app(FakeGitHubConfig(gists_per_user=250, payload_bytes=600)))
+    response = fake.get("/users/octocat/gists", params={"page": 1, "per_page": 100})
+    assert response.status_code == 200
+    assert len(response.json()) == 100
+    assert 'rel="last"' in response.headers["Link"]
+    assert "page=3" in response.links["last"]["url"]
+    last = fake.get("/users/octocat/gists", params={"page": 3, "per_page": 100})
+    assert len(last.json()) == 50
+    assert "next" not in last.links
+    assert 500 < len(response.content) / 100 < 700
+
+
+def test_fake_github_counts_full_and_conditional_responses():
+    fake = TestClient(create_app(FakeGitHubConfig()))
+    etag = fake.get("/users/octocat/gists").headers["ETag"]
+    assert fake.get("/users/octocat/gists", headers={"If-None-Match": etag}).status_code == 304
+    assert fake.get("/_stats").json() == {"requests": 2, "full": 1, "not_modified": 1}
+    fake.post("/_reset")
+    assert fake.get("/_stats").json() == {}
+
+
+def test_fake_github_rate_limit_and_errors():
+    fake = TestClient(create_app(FakeGitHubConfig(rate_limit=2)))
+    first = fake.get("/users/octocat/gists")
+    assert first.headers["X-RateLimit-Remaining"] == "1"
+    fake.get("/users/octocat/gists")
+    limited = fake.get("/users/octocat/gists")
+    assert limited.status_code == 403
+    assert limited.headers["X-RateLimit-Remaining"] == "0"
+
+    failing = TestClient(create_app(FakeGitHubConfig(error_rate=1.0, error_status=503)))
+    assert failing.get("/users/octocat/gists").status_code == 503
+    assert failing.get("/users/missing-user/gists").status_code == 503
+    assert TestClient(create_app(FakeGitHubConfig())).get("/users/missing-user/gists").status_code == 404
+
+
+def test_fake_github_config_from_env(monkeypatch):
+    monkeypatch.setenv("FAKE_GITHUB_LATENCY_MS", "12.5")
+    monkeypatch.setenv("FAKE_GITHUB_GISTS_PER_USER", "7")
+    config = FakeGitHubConfig.from_env()
+    assert (config.latency_ms, config.gists_per_user) == (12.5, 7)
+    assert config.to_env()["FAKE_GITHUB_GISTS_PER_USER"] == "7"
+
+
+@pytest.mark.anyio
+async def test_service_against_fake_github():
+    fake = create_app(FakeGitHubConfig(gists_per_user=230))
+    client = create_http_client(Settings(github_token=None), transport=httpx.ASGITransport(app=fake))
+    service = GistService(client, TTLCache(ttl=60))
+    items, total = await service.get_window("octocat", 150, 50)
+    assert total == 230
+    assert len(items) == 50
+    await client.aclose()
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([], 50) is None
+
+
+def test_serialization_benchmark_matches_legacy_pipeline():
+    # run() raises if the current and legacy pipelines disagree
+    report = run(parse_args(["--gists", "30", "--size", "20", "--rounds", "2"]))
+    assert set(report["us_per_call"]) == {"parse", "render"}
+
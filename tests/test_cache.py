@@ -0,0 +1,169 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.schemas.gists import GistSummary
+from app.services.cache import CacheState, TTLCache
+from app.services.gists import CachedGists
+
+
+def test_fresh_stale_and_expired_lookups(clock):
+    cache = TTLCache(ttl=10, stale_ttl=5, clock=clock)
+    cache.set("octocat", ["gist"], size=10)
+
+    assert cache.get("octocat").state is CacheState.FRESH
+    clock.now += 12
+    lookup = cache.get("octocat")
+    assert lookup.state is CacheState.STALE
+    assert lookup.value == ["gist"]
+    clock.now += 4
+    lookup = cache.get("octocat")
+    assert lookup.state is CacheState.EXPIRED
+    assert lookup.value == ["gist"]
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.get("unknown").state is CacheState.MISS
+
+
+def test_peek_reports_age_without_counting_or_touching_lru(clock):
+    cache = TTLCache(ttl=10, stale_ttl=5, max_entries=2, clock=clock)
+    cache.set("a", 1, size=1)
+    cache.set("b", 2, size=1)
+    clock.now += 12
+    lookup = cache.peek("a")
+    assert (lookup.state, lookup.value, lookup.age) == (CacheState.STALE, 1, 12)
+    assert cache.peek("missing").state is CacheState.MISS
+    assert cache.stats()["hits"] == cache.stats()["stale_hits"] == cache.stats()["misses"] == 0
+    # "a" was only peeked, so it is still the least recently used
+    cache.set("c", 3, size=1)
+    assert "a" not in cache
+
+
+def test_lru_eviction_by_entry_count():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1, size=1)
+    cache.set("b", 2, size=1)
+    cache.get("a")
+    cache.set("c", 3, size=1)
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.evictions == 1
+
+
+def test_lru_eviction_by_bytes():
+    cache = TTLCache(ttl=60, max_bytes=100)
+    cache.set("a", 1, size=60)
+    cache.set("b", 2, size=60)
+
+    assert "a" not in cache
+    assert cache.stats()["bytes"] == 60
+    cache.set("huge", 3, size=500)
+    assert "huge" not in cache
+    assert "b" in cache
+
+
+@pytest.mark.anyio
+async def test_stale_entry_served_while_single_refresh_runs(github_service, clock):
+    release = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await release.wait()
+        return httpx.Response(200, json=[{"id": "new", "html_url": "https://gist.github.com/new", "description": None}])
+
+    service = github_service(handler, TTLCache(ttl=10, stale_ttl=60, clock=clock))
+    old = [GistSummary(id="old", html_url="https://gist.github.com/old", description=None)]
+    service.cache.set(service.page_key("octocat", 1), CachedGists(old), size=1)
+    clock.now += 20
+
+    assert (await service.get_page("octocat")).gists == old
+    assert (await service.get_page("octocat")).gists == old
+    await asyncio.sleep(0.01)
+    assert len(github_service.calls) == 1
+
+    release.set()
+    await asyncio.gather(*service._refreshing.values())
+    clock.now += 1
+    assert [g.id for g in (await service.get_page("octocat")).gists] == ["new"]
+
+
+class ConditionalGitHub:
+    """
+    Stub gists listing that honours If-None-Match and counts full vs 304 replies.
+    """
+
+    def __init__(self):
+        self.etag = '"v1"'
+        self.gists = [{"id": "1", "html_url": "https://gist.github.com/1", "description": "one"}]
+        self.full = 0
+        self.not_modified = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.headers.get("If-None-Match") == self.etag:
+            self.not_modified += 1
+            return httpx.Response(304, headers={"ETag": self.etag})
+        self.full += 1
+        return httpx.Response(200, json=self.gists, headers={"ETag": self.etag, "Last-Modified": "Wed, 01 Oct 2025 00:00:00 GMT"})
+
+
+@pytest.mark.anyio
+async def test_expired_entry_revalidated_with_etag(github_service, clock):
+    github = ConditionalGitHub()
+    service = github_service(github, TTLCache(ttl=10, stale_ttl=0, clock=clock))
+
+    first = await service.get_page("octocat")
+    clock.now += 11
+    second = await service.get_page("octocat")
+
+    assert second.gists is first.gists
+    assert (github.full, github.not_modified) == (1, 1)
+    assert service.stats()["upstream_full"] == 1
+    assert service.stats()["upstream_not_modified"] == 1
+
+    github.etag = '"v2"'
+    github.gists = [{"id": "2", "html_url": "https://gist.github.com/2", "description": None}]
+    clock.now += 11
+    assert [g.id for g in (await service.get_page("octocat")).gists] == ["2"]
+    assert (github.full, github.not_modified) == (2, 1)
+
+
+@pytest.mark.anyio
+async def test_conditional_request_carries_validators(github_service, clock):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=[], headers={"ETag": 'W/"abc"', "Last-Modified": "Wed, 01 Oct 2025 00:00:00 GMT"})
+
+    service = github_service(handler, TTLCache(ttl=1, clock=clock))
+    await service.get_page("octocat")
+    clock.now += 5
+    await service.get_page("octocat")
+
+    first, second = (call.headers for call in github_service.calls)
+    assert "If-None-Match" not in first
+    assert second["If-None-Match"] == 'W/"abc"'
+    assert second["If-Modified-Since"] == "Wed, 01 Oct 2025 00:00:00 GMT"
+
+
+@pytest.mark.anyio
+async def test_iter_pages_cancels_prefetch_when_closed(github_service):
+    cancelled = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params["page"])
+        if page == 2:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        link = f'<{request.url.copy_with(params={"page": page + 1})}>; rel="next"'
+        return httpx.Response(200, json=[{"id": str(page), "html_url": "https://gist.github.com/x", "description": None}], headers={"Link": link})
+
+    service = github_service(handler)
+    pages = service.iter_pages("octocat")
+
+    assert [g.id for g in await anext(pages)] == ["1"]
+    await asyncio.sleep(0.01)
+    await pages.aclose()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert len(service.cache) == 0
@@ -0,0 +1,65 @@
+import gzip
+
+import pytest
+
+from app.api import http_cache
+from app.api.http_cache import (
+    RangeNotSatisfiable, byte_range, compress, encoded_etag, etag_matches, negotiate_encoding, strong_etag,
+)
+
+
+def test_strong_etag_depends_on_every_part():
+    etag = strong_etag(["a", None, 3])
+    assert etag == strong_etag(["a", None, 3])
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag != strong_etag(["a", "None", 3])
+    assert etag != strong_etag(["aNone", 3])
+    assert strong_etag(["ab", "c"]) != strong_etag(["a", "bc"])
+
+
+def test_etag_matching_is_weak_and_ignores_content_coding():
+    etag = strong_etag(["x"])
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches(encoded_etag(etag, "gzip"), etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("*;q=0.5, gzip;q=0") == ("br" if http_cache.brotli else None)
+    assert negotiate_encoding("deflate, gzip;q=bogus") is None
+
+
+@pytest.mark.skipif(http_cache.brotli is None, reason="brotli not installed")
+def test_brotli_preferred_when_available():
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("gzip, br;q=0.5") == "gzip"
+    body = b'{"items": []}' * 100
+    assert http_cache.brotli.decompress(compress(body, "br")) == body
+
+
+def test_gzip_is_deterministic():
+    body = b'{"items": []}' * 100
+    assert compress(body, "gzip") == compress(body, "gzip")
+    assert gzip.decompress(compress(body, "gzip")) == body
+
+
+def test_byte_range():
+    assert byte_range(None, 100) is None
+    assert byte_range("bytes=0-9", 100) == (0, 9)
+    assert byte_range("bytes=90-", 100) == (90, 99)
+    assert byte_range("bytes=90-200", 100) == (90, 99)
+    assert byte_range("bytes=-10", 100) == (90, 99)
+    assert byte_range("bytes=-500", 100) == (0, 99)
+    # Ignored: several ranges, other units, malformed or reversed
+    for header in ("bytes=0-1,5-6", "items=0-1", "bytes=a-b", "bytes=5", "bytes=9-3"):
+        assert byte_range(header, 100) is None
+    for header in ("bytes=100-", "bytes=-0"):
+        with pytest.raises(RangeNotSatisfiable):
+            byte_range(header, 100)
@@ -1,13 +1,96 @@
+import asyncio
+import json
+import time
+import tracemalloc
+import httpx
 import pytest
 from fastapi.testclient import TestClient
+from fastapi_pagination import Page
+from app.config import Settings
 from app.main import app
 from app.schemas.common import GitHubUsername
+from app.schemas.gists import GistSummary
+from app.services.files import GistFileService
+from app.services.gists import GistService, create_gist_cache
+from app.services.github import create_raw_client, create_token_pool
 from pydantic import ValidationError
 
 
 client = TestClient(app)
 
-def test_get_gists_octocat():
+OCTOCAT_GISTS = [
+    {
+        "id": "6cad326836d38bd3a7ae",
+        "html_url": "https://gist.github.com/octocat/6cad326836d38bd3a7ae",
+        "description": "Hello world!",
+        "files": {"hello_world.rb": {"filename": "hello_world.rb", "language": "Ruby"}},
+    },
+    {
+        "id": "0831f3fbd83ac4d46451",
+        "html_url": "https://gist.github.com/octocat/0831f3fbd83ac4d46451",
+        "description": None,
+        "files": {"test.md": {"filename": "test.md", "language": "Markdown"}},
+    },
+]
+
+
+def paginated_gists(count: int):
+    """
+    Handler serving `count` generated gists with GitHub-style page/per_page and Link headers.
+    """
+    gists = [
+        {"id": f"g{i}", "html_url": f"https://gist.github.com/u/g{i}", "description": f"gist {i}"}
+        for i in range(count)
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params.get("page", 1))
+        per_page = int(request.url.params.get("per_page", 30))
+        last = max(1, -(-count // per_page))
+        base = str(request.url.copy_with(query=None))
+        links = []
+        if page < last:
+            links.append(f'<{base}?page={page + 1}&per_page={per_page}>; rel="next"')
+            links.append(f'<{base}?page={last}&per_page={per_page}>; rel="last"')
+        if page > 1:
+            links.append(f'<{base}?page=1&per_page={per_page}>; rel="first"')
+        headers = {"Link": ", ".join(links)} if links else {}
+        body = gists[(page - 1) * per_page:page * per_page]
+        return httpx.Response(200, json=body, headers=headers)
+
+    return handler
+
+
+@pytest.fixture(autouse=True)
+def github_api(github_service):
+    """
+    Installs github_service's stand-in for GitHub on the app, with a fresh gist
+    cache. Call it with a handler taking an httpx.Request and returning an
+    httpx.Response. The default handler serves OCTOCAT_GISTS.
+    Sent requests are recorded on `.calls`.
+    """
+    def default_handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=OCTOCAT_GISTS)
+
+    def install(handler=default_handler, tokens=()):
+        settings = Settings(github_token=None, github_tokens=tuple(tokens), rate_limit_reserve=0)
+        app.state.token_pool = create_token_pool(settings)
+        app.state.gist_service = github_service(handler, settings=settings, token_pool=app.state.token_pool)
+        app.state.http_client = app.state.gist_service.client
+        app.state.raw_client = create_raw_client(settings, transport=github_service.transport)
+        app.state.file_service = GistFileService(app.state.http_client, app.state.raw_client, max_file_bytes=1024)
+        return install
+
+    install.calls = github_service.calls
+    install()
+    yield install
+    del app.state.token_pool
+    del app.state.http_client
+    del app.state.raw_client
+    del app.state.gist_service
+    del app.state.file_service
+
+def test_get_gists_octocat(github_api):
     """
     Validates that the /octocat endpoint returns a list of gists.
     """
@@ -25,13 +108,66 @@ def test_get_gists_octocat():
         assert "total" in data
         assert "pages" in data
         
-def test_rate_limit_exceeded_handling(monkeypatch):
-    def mock_rate_limited_get(*args, **kwargs):
-        class MockResponse:
-            status_code = 403
-            def json(self): return {}
-        return MockResponse()
-    monkeypatch.setattr("requests.get", mock_rate_limited_get)
+def test_get_gists_body_matches_page_model(github_api):
+    github_api(paginated_gists(120))
+    response = client.get("/octocat", params={"page": 3, "size": 50})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    page = Page[GistSummary].model_validate_json(response.content)
+    assert response.content == page.model_dump_json().encode()
+    assert (page.total, page.page, page.size, page.pages, len(page.items)) == (120, 3, 50, 3, 20)
+
+def test_get_gists_invalid_upstream_payload(github_api):
+    github_api(lambda request: httpx.Response(200, json={"message": "not a list"}))
+    assert client.get("/octocat").status_code == 502
+    github_api(lambda request: httpx.Response(200, json=[{"html_url": "https://gist.github.com/x"}]))
+    response = client.get("/octocat")
+    assert response.status_code == 502
+    assert response.json()["detail"] == "Invalid response from GitHub API."
+    github_api(lambda request: httpx.Response(200, content=b"[{"))
+    assert client.get("/octocat").status_code == 502
+
+def test_get_gists_etag_and_not_modified(github_api):
+    first = client.get("/octocat")
+    etag = first.headers["ETag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+    assert first.headers["Cache-Control"] == "public, max-age=60, stale-while-revalidate=300"
+    assert first.headers["Vary"] == "Accept-Encoding"
+
+    revalidated = client.get("/octocat", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["ETag"] == etag
+    assert len(github_api.calls) == 1
+    assert client.get("/octocat", params={"size": 1}).headers["ETag"] != etag
+    assert client.get("/octocat", headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_get_gists_compressed_when_large_and_accepted(github_api):
+    github_api(paginated_gists(120))
+    plain = client.get("/octocat", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+
+    compressed = client.get("/octocat", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.content == plain.content
+    assert int(compressed.headers["Content-Length"]) < len(plain.content) / 3
+    assert compressed.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    # A compressed representation's tag revalidates the same content
+    revalidated = client.get(
+        "/octocat", headers={"If-None-Match": compressed.headers["ETag"], "Accept-Encoding": "gzip"}
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == compressed.headers["ETag"]
+    revalidated = client.get(
+        "/octocat", headers={"If-None-Match": plain.headers["ETag"], "Accept-Encoding": "identity"}
+    )
+    assert revalidated.headers["ETag"] == plain.headers["ETag"]
+
+    small = client.get("/octocat", params={"size": 1}, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+def test_rate_limit_exceeded_handling(github_api):
+    github_api(lambda request: httpx.Response(403, json={}))
     response = client.get("/octocat")
     assert response.status_code == 403
     assert response.json()["detail"] == "Rate limit exceeded. Please try again later."
@@ -45,16 +181,11 @@ def test_get_gists_invalid_username():
     assert "detail" in response.json()
     assert response.json()["detail"] == "Invalid input. Please check the username or query parameters."
     
-def test_get_gists_empty_username(monkeypatch):
+def test_get_gists_empty_username(github_api):
     """
     Validates that the / endpoint returns a 422 error for an empty username.
     """
-    def mock_get(*args, **kwargs):
-        class MockResponse:
-            status_code = 404
-            def json(self): return {"message": "Not Found"}
-        return MockResponse()
-    monkeypatch.setattr("requests.get", mock_get)
+    github_api(lambda request: httpx.Response(404, json={"message": "Not Found"}))
     response = client.get("/invalidusername")
     assert response.status_code == 404
     assert "detail" in response.json()
@@ -279,24 +410,18 @@ def test_get_gists_valid_username_with_hyphen_in_start_and_end_and_middle_and_hy
     assert "detail" in response.json()
     assert response.json()["detail"] == "Invalid input. Please check the username or query parameters."
 
-def test_get_gists_nonexistent_user(monkeypatch):
+def test_get_gists_nonexistent_user(github_api):
     """
     Validates that the /nonexistentuser endpoint returns a 404 error if user not found.
     """
-    def mock_github_404(*args, **kwargs):
-        class MockResponse:
-            status_code = 404
-            def json(self): return {"message": "Not Found"}
-        return MockResponse()
-
-    monkeypatch.setattr("requests.get", mock_github_404)
+    github_api(lambda request: httpx.Response(404, json={"message": "Not Found"}))
 
     response = client.get("/nonexistentuser")
     assert response.status_code == 404
     assert "detail" in response.json()
     assert response.json()["detail"] == "GitHub user 'nonexistentuser' not found."
         
-def test_valid_username():
+def test_valid_username(github_api):
     response = client.get("/octocat")
     assert response.status_code == 200
     data = response.json()
@@ -311,4 +436,516 @@ def test_invalid_username_emoji():
 
 def test_invalid_username_hyphen_start():
     response = client.get("/-user")
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+def test_get_gists_calls_github_users_endpoint(github_api):
+    response = client.get("/octocat")
+    assert response.status_code == 200
+    assert len(github_api.calls) == 1
+    assert github_api.calls[0].url.path == "/users/octocat/gists"
+
+def test_get_gists_upstream_timeout(github_api):
+    def timeout(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+    github_api(timeout)
+    response = client.get("/octocat")
+    assert response.status_code == 504
+    assert response.json()["detail"] == "GitHub API timed out."
+
+def test_get_gists_upstream_unreachable(github_api):
+    def refused(request):
+        raise httpx.ConnectError("connection refused", request=request)
+    github_api(refused)
+    response = client.get("/octocat")
+    assert response.status_code == 502
+    assert response.json()["detail"] == "Error communicating with GitHub API."
+
+def test_lifespan_manages_shared_http_client():
+    del app.state.token_pool
+    del app.state.http_client
+    del app.state.gist_service
+    with TestClient(app) as lifespan_client:
+        http_client = app.state.http_client
+        assert isinstance(http_client, httpx.AsyncClient)
+        assert str(http_client.base_url).rstrip("/") == "https://api.github.com"
+        raw_client = app.state.raw_client
+        assert lifespan_client.get("/favicon.ico").status_code == 204
+    assert http_client.is_closed
+    assert raw_client.is_closed
+
+def test_get_gists_served_from_cache(github_api):
+    first = client.get("/octocat")
+    second = client.get("/OctoCat")
+    assert first.status_code == second.status_code == 200
+    assert first.json()["items"] == second.json()["items"]
+    assert len(github_api.calls) == 1
+
+def test_get_gists_errors_are_not_cached(github_api):
+    github_api(lambda request: httpx.Response(403, json={}))
+    assert client.get("/octocat").status_code == 403
+    github_api()
+    assert client.get("/octocat").status_code == 200
+
+def test_cache_stats(github_api):
+    client.get("/octocat")
+    client.get("/octocat")
+    stats = client.get("/cache/stats").json()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["entries"] == 1
+    assert stats["evictions"] == 0
+
+def test_sqlite_cache_backend(github_api, tmp_path):
+    # Requests run on other threads than the one that opened the database
+    settings = Settings(github_token=None, cache_backend="sqlite", cache_path=str(tmp_path / "cache.db"))
+    app.state.gist_service = GistService(app.state.http_client, create_gist_cache(settings))
+    assert client.get("/octocat").status_code == 200
+    assert client.get("/octocat").json()["total"] == 2
+    response = client.get("/cache/stats")
+    assert response.status_code == 200
+    assert response.json()["entries"] == 1
+    assert response.json()["hits"] == 1
+    assert len(github_api.calls) == 1
+    app.state.gist_service.cache.close()
+
+def test_pagination_reports_total_beyond_first_upstream_page(github_api):
+    github_api(paginated_gists(250))
+    response = client.get("/octocat", params={"page": 1, "size": 50})
+    data = response.json()
+    assert response.status_code == 200
+    assert data["total"] == 250
+    assert data["pages"] == 5
+    assert [item["id"] for item in data["items"]] == [f"g{i}" for i in range(50)]
+    pages = sorted(int(call.url.params["page"]) for call in github_api.calls)
+    assert pages == [1, 3]
+    assert all(call.url.params["per_page"] == "100" for call in github_api.calls)
+
+def test_pagination_deep_page_fetches_only_covering_upstream_pages(github_api):
+    github_api(paginated_gists(1000))
+    response = client.get("/octocat", params={"page": 6, "size": 40})
+    data = response.json()
+    assert data["total"] == 1000
+    assert [item["id"] for item in data["items"]] == [f"g{i}" for i in range(200, 240)]
+    assert sorted(int(call.url.params["page"]) for call in github_api.calls) == [3, 10]
+
+def test_pagination_window_spanning_upstream_pages(github_api):
+    github_api(paginated_gists(180))
+    response = client.get("/octocat", params={"page": 2, "size": 90})
+    data = response.json()
+    assert data["total"] == 180
+    assert [item["id"] for item in data["items"]] == [f"g{i}" for i in range(90, 180)]
+    assert sorted(int(call.url.params["page"]) for call in github_api.calls) == [1, 2]
+
+def test_pagination_past_the_last_page(github_api):
+    github_api(paginated_gists(120))
+    response = client.get("/octocat", params={"page": 10, "size": 50})
+    data = response.json()
+    assert response.status_code == 200
+    assert data["items"] == []
+    assert data["total"] == 120
+
+def test_user_without_gists_is_404(github_api):
+    github_api(lambda request: httpx.Response(200, json=[]))
+    response = client.get("/octocat")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "No gists found for GitHub user 'octocat'."
+
+def searchable_gists(count: int):
+    """
+    paginated_gists, but with files, visibility and dates: gist i is Python when
+    i is even (else Go), secret every 5th, and was updated in reverse order.
+    """
+    handler = paginated_gists(count)
+
+    def searchable(request: httpx.Request) -> httpx.Response:
+        response = handler(request)
+        gists = json.loads(response.content)
+        for gist in gists:
+            i = int(gist["id"][1:])
+            gist["files"] = {f"main{i}.{'py' if i % 2 == 0 else 'go'}": {"language": "Python" if i % 2 == 0 else "Go"}}
+            gist["public"] = i % 5 != 0
+            gist["created_at"] = f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}Z"
+            gist["updated_at"] = f"2024-06-01T00:{(count - i) // 60:02d}:{(count - i) % 60:02d}Z"
+        return httpx.Response(200, json=gists, headers=response.headers)
+
+    return searchable
+
+def test_search_filters_before_paginating(github_api):
+    github_api(searchable_gists(250))
+    response = client.get("/octocat", params={"language": "python", "public": "true", "size": 20, "page": 2})
+    data = response.json()
+    assert response.status_code == 200
+    # Even ids not divisible by 5: 100 of the 125 Python gists
+    assert data["total"] == 100
+    assert data["pages"] == 5
+    assert [item["id"] for item in data["items"]] == [f"g{i}" for i in range(50, 100, 2) if i % 5][:20]
+    assert set(data["items"][0]) == {"id", "html_url", "description"}
+    assert sorted(int(call.url.params["page"]) for call in github_api.calls) == [1, 2, 3]
+
+def test_search_matches_words_and_sorts_by_date(github_api):
+    github_api(searchable_gists(150))
+    data = client.get("/octocat", params={"q": "Gist", "sort": "created", "size": 3}).json()
+    assert data["total"] == 150
+    assert [item["id"] for item in data["items"]] == ["g149", "g148", "g147"]
+    data = client.get("/octocat", params={"q": "main7 go", "sort": "updated"}).json()
+    assert [item["id"] for item in data["items"]] == ["g7"]
+
+def test_search_is_answered_from_the_index_without_upstream_calls(github_api):
+    github_api(searchable_gists(250))
+    client.get("/octocat", params={"q": "gist"})
+    calls = len(github_api.calls)
+    for params in ({"q": "gist 7"}, {"language": "go"}, {"public": "false"}, {"sort": "updated"}):
+        assert client.get("/octocat", params=params).status_code == 200
+    assert len(github_api.calls) == calls
+
+def test_search_without_matches_is_empty_not_404(github_api):
+    github_api(searchable_gists(10))
+    response = client.get("/octocat", params={"q": "nothing-like-this"})
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+    assert response.json()["total"] == 0
+    assert client.get("/octocat", params={"q": "--"}).json()["total"] == 0
+    github_api(lambda request: httpx.Response(200, json=[]))
+    assert client.get("/octocat", params={"q": "gist"}).status_code == 404
+
+def test_search_rejects_unknown_sort(github_api):
+    assert client.get("/octocat", params={"sort": "stars"}).status_code == 422
+
+def test_export_streams_every_gist_as_ndjson(github_api):
+    github_api(paginated_gists(250))
+    response = client.get("/octocat/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    assert len(lines) == 250
+    assert json.loads(lines[0]) == {"id": "g0", "html_url": "https://gist.github.com/u/g0", "description": "gist 0"}
+    assert json.loads(lines[-1])["id"] == "g249"
+    assert sorted(int(call.url.params["page"]) for call in github_api.calls) == [1, 2, 3]
+
+def test_export_maps_upstream_errors_before_streaming(github_api):
+    github_api(lambda request: httpx.Response(404, json={"message": "Not Found"}))
+    response = client.get("/nonexistentuser/export")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "GitHub user 'nonexistentuser' not found."
+
+def test_export_user_without_gists(github_api):
+    github_api(lambda request: httpx.Response(200, json=[]))
+    assert client.get("/octocat/export").status_code == 404
+
+def test_export_invalid_username():
+    response = client.get("/-octocat/export")
+    assert response.status_code == 422
+
+RAW = "https://gist.githubusercontent.com/octocat/aa5a315d61ae9438b18d/raw/0123abcd"
+
+def gist_files(files: dict[str, bytes], owner: str = "octocat"):
+    """
+    Handler serving GET /gists/{id} for a gist with `files`, and each file's raw
+    content, honouring single byte ranges like GitHub's raw host does.
+    """
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "api.github.com":
+            if request.url.path != "/gists/aa5a315d61ae9438b18d":
+                return httpx.Response(404, json={"message": "Not Found"})
+            return httpx.Response(200, json={
+                "id": "aa5a315d61ae9438b18d",
+                "owner": {"login": owner},
+                "files": {
+                    name: {"filename": name, "raw_url": f"{RAW}/{name}", "size": len(content), "truncated": True,
+                           "content": content[:10].decode()}
+                    for name, content in files.items()
+                },
+            })
+        content = files[request.url.path.rsplit("/", 1)[1]]
+        headers = {"Content-Type": "text/plain; charset=utf-8"}
+        if "Range" in request.headers:
+            start, end = (int(n) for n in request.headers["Range"].removeprefix("bytes=").split("-"))
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+            return httpx.Response(206, content=content[start:end + 1], headers=headers)
+        return httpx.Response(200, content=content, headers=headers)
+
+    return handler
+
+def raw_calls(github_api) -> list[httpx.Request]:
+    return [call for call in github_api.calls if call.url.host != "api.github.com"]
+
+def test_gist_file_small_files_are_cached_by_content(github_api):
+    github_api(gist_files({"a.txt": b"hello world", "b.txt": b"hello world"}), tokens=["aaaa"])
+    url = "/octocat/aa5a315d61ae9438b18d/files/a.txt"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == b"hello world"
+    assert response.headers["content-type"] == "text/plain; charset=utf-8"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert client.get(url).content == b"hello world"
+    assert client.get("/octocat/aa5a315d61ae9438b18d/files/b.txt").content == b"hello world"
+    # One metadata call; one raw download per file, and the token is never sent to the raw host
+    assert len(github_api.calls) == 3
+    assert all("Authorization" not in call.headers for call in raw_calls(github_api))
+    stats = app.state.file_service.stats()
+    assert (stats["files"], stats["blobs"], stats["bytes"]) == (2, 1, 11)
+
+def test_gist_file_raw_host_failures_do_not_trip_the_api_breaker(github_api):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/users/octocat/gists":
+            return httpx.Response(200, json=OCTOCAT_GISTS)
+        if request.url.host == "api.github.com":
+            return gist_files({"a.txt": b"hello"})(request)
+        return httpx.Response(503)
+    github_api(handler)
+
+    for _ in range(Settings().breaker_failures + 1):
+        assert client.get("/octocat/aa5a315d61ae9438b18d/files/a.txt").status_code == 502
+    # Raw downloads are not retried, and the API circuit stays closed
+    assert len(raw_calls(github_api)) == Settings().breaker_failures + 1
+    assert client.get("/octocat").status_code == 200
+
+def test_gist_file_ranges_and_conditional_requests(github_api):
+    github_api(gist_files({"a.txt": b"0123456789"}))
+    url = "/octocat/aa5a315d61ae9438b18d/files/a.txt"
+    response = client.get(url, headers={"Range": "bytes=2-4"})
+    assert response.status_code == 206
+    assert response.content == b"234"
+    assert response.headers["content-range"] == "bytes 2-4/10"
+    response = client.get(url, headers={"Range": "bytes=20-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */10"
+    assert client.get(url, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+def test_gist_file_large_files_are_streamed_with_ranges(github_api):
+    content = bytes(range(256)) * 64
+    github_api(gist_files({"big.bin": content}))
+    url = "/octocat/aa5a315d61ae9438b18d/files/big.bin"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["content-length"] == str(len(content))
+    response = client.get(url, headers={"Range": "bytes=1000-1999"})
+    assert response.status_code == 206
+    assert response.content == content[1000:2000]
+    assert response.headers["content-range"] == f"bytes 1000-1999/{len(content)}"
+    # Streamed straight through: forwarded upstream and never stored
+    assert [call.headers.get("Range") for call in raw_calls(github_api)] == [None, "bytes=1000-1999"]
+    assert app.state.file_service.stats()["bytes"] == 0
+
+@pytest.mark.anyio
+async def test_gist_file_streaming_memory_is_flat(github_api):
+    size, chunk = 16 * 1024 * 1024, b"x" * 65536
+
+    class Chunks(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            for _ in range(size // len(chunk)):
+                yield chunk
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "api.github.com":
+            files = {"big.bin": {"raw_url": f"{RAW}/big.bin", "size": size}}
+            return httpx.Response(200, json={"owner": {"login": "octocat"}, "files": files})
+        return httpx.Response(200, stream=Chunks(), headers={"Content-Length": str(size)})
+    github_api(handler)
+
+    # Called as raw ASGI: test clients buffer the whole response body
+    sent = 0
+    async def send(message):
+        nonlocal sent
+        sent += len(message.get("body", b""))
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()
+    path = "/octocat/aa5a315d61ae9438b18d/files/big.bin"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"testserver")], "server": ("testserver", 80), "client": ("testclient", 1),
+    }
+    tracemalloc.start()
+    try:
+        await app(scope, receive, send)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert sent == size
+    assert peak < 2 * 1024 * 1024
+
+def test_gist_file_not_found(github_api):
+    github_api(gist_files({"a.txt": b"x"}))
+    assert client.get("/octocat/aa5a315d61ae9438b18d/files/missing.txt").status_code == 404
+    assert client.get("/hubot/aa5a315d61ae9438b18d/files/a.txt").status_code == 404
+    response = client.get("/octocat/ffffffffffffffffffff/files/a.txt")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Gist 'ffffffffffffffffffff' not found."
+    assert client.get("/octocat/not-a-gist-id/files/a.txt").status_code == 422
+
+def test_batch_returns_results_and_errors_per_user(github_api):
+    def handler(request):
+        if request.url.path == "/users/ghost/gists":
+            return httpx.Response(404, json={"message": "Not Found"})
+        if request.url.path == "/users/empty/gists":
+            return httpx.Response(200, json=[])
+        if request.url.path == "/users/limited/gists":
+            return httpx.Response(403, json={})
+        if request.url.path == "/users/slow/gists":
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, json=OCTOCAT_GISTS)
+    github_api(handler)
+
+    response = client.post("/batch", json={"usernames": ["octocat", "ghost", "empty", "limited", "slow"]}, params={"size": 1})
+    assert response.status_code == 200
+    results = {r["username"]: r for r in response.json()["results"]}
+    assert [r["username"] for r in response.json()["results"]] == ["octocat", "ghost", "empty", "limited", "slow"]
+    assert results["octocat"]["status_code"] == 200
+    assert results["octocat"]["total"] == 2
+    assert [item["id"] for item in results["octocat"]["items"]] == ["6cad326836d38bd3a7ae"]
+    assert results["ghost"] == {"username": "ghost", "status_code": 404, "total": None, "items": None, "detail": "GitHub user 'ghost' not found."}
+    assert results["empty"]["status_code"] == 404
+    assert results["empty"]["detail"] == "No gists found for GitHub user 'empty'."
+    assert results["limited"]["status_code"] == 403
+    assert results["slow"]["status_code"] == 504
+
+def test_batch_rejects_invalid_usernames(github_api):
+    response = client.post("/batch", json={"usernames": ["octocat", "-bad-"]})
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Invalid input. Please check the username or query parameters."
+    assert client.post("/batch", json={"usernames": []}).status_code == 422
+    assert github_api.calls == []
+
+def test_batch_stream_emits_one_line_per_user(github_api):
+    response = client.post("/batch/stream", json={"usernames": ["octocat", "hubot", "ghost"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(r["username"] for r in results) == ["ghost", "hubot", "octocat"]
+    assert all(r["status_code"] == 200 for r in results)
+
+def test_requests_use_token_with_most_budget(github_api):
+    budgets = {"token aaaa": 10, "token bbbb": 500}
+
+    def handler(request):
+        auth = request.headers["Authorization"]
+        budgets[auth] -= 1
+        headers = {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": str(budgets[auth]), "X-RateLimit-Reset": "4102444800"}
+        return httpx.Response(200, json=OCTOCAT_GISTS, headers=headers)
+    github_api(handler, tokens=["aaaa", "bbbb"])
+
+    client.get("/octocat")
+    client.get("/hubot")
+    assert [call.headers["Authorization"] for call in github_api.calls] == ["token aaaa", "token bbbb"]
+    stats = client.get("/ratelimit/stats").json()
+    assert {t["token"]: t["remaining"] for t in stats["tokens"]} == {"token-0": 9, "token-1": 499}
+    # Tokens are named by position, never by any of their characters
+    metrics_text = client.get("/metrics").text
+    assert 'github_rate_limit_remaining{token="token-1"} 499' in metrics_text
+    assert "bbbb" not in metrics_text
+
+def test_exhausted_budget_fails_fast_with_retry_after(github_api):
+    reset = int(time.time()) + 120
+
+    def handler(request):
+        headers = {"X-RateLimit-Limit": "60", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)}
+        return httpx.Response(200, json=OCTOCAT_GISTS, headers=headers)
+    github_api(handler)
+
+    assert client.get("/octocat").status_code == 200
+    response = client.get("/hubot")
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Rate limit exceeded. Please try again later."
+    assert 100 <= int(response.headers["Retry-After"]) <= 120
+    assert len(github_api.calls) == 1
+    assert client.get("/ratelimit/stats").json()["rejected"] == 1
+
+def test_exhausted_budget_serves_expired_cache(github_api):
+    reset = int(time.time()) + 120
+
+    def handler(request):
+        headers = {"X-RateLimit-Limit": "60", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)}
+        return httpx.Response(200, json=OCTOCAT_GISTS, headers=headers)
+    github_api(handler)
+    app.state.gist_service.cache.ttl = 0
+
+    first = client.get("/octocat")
+    second = client.get("/octocat")
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert len(github_api.calls) == 1
+
+def test_open_circuit_fails_fast_and_serves_expired_cache(github_api):
+    failing = False
+
+    def handler(request):
+        if failing:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json=OCTOCAT_GISTS)
+    github_api(handler)
+    app.state.gist_service.cache.ttl = 0
+    first = client.get("/octocat")
+
+    failing = True
+    # 3 attempts (2 retries) per request; the 5th consecutive failure opens the circuit
+    assert client.get("/hubot").status_code == 502
+    calls = len(github_api.calls)
+    response = client.get("/hubot")
+    assert len(github_api.calls) == calls + 2
+    calls = len(github_api.calls)
+
+    assert response.status_code == 503
+    assert response.json()["detail"] == "GitHub API is unavailable. Please try again later."
+    assert 1 <= int(response.headers["Retry-After"]) <= 30
+    cached = client.get("/octocat")
+    assert cached.status_code == 200
+    assert cached.json() == first.json()
+    assert len(github_api.calls) == calls
+    assert "github_circuit_state 2" in client.get("/metrics").text
+
+def test_metrics_endpoint_reports_routes_upstream_and_cache(github_api):
+    client.get("/octocat")
+    client.get("/octocat", params={"size": 10})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/{username}",status="200"}' in body
+    assert 'github_request_duration_seconds_bucket{status="200",le="+Inf"}' in body
+    assert "github_requests_in_flight 0" in body
+    assert 'http_response_size_bytes_count{method="GET",route="/{username}"}' in body
+    assert "pagination_page_size_count" in body
+    assert "pagination_upstream_pages_count" in body
+    assert "gist_cache_hits 1" in body
+    assert "github_rate_limit_rejected 0" in body
+
+def test_metrics_route_is_not_a_username(github_api):
+    client.get("/metrics")
+    assert github_api.calls == []
+
+def test_server_timing_header_breaks_down_request(github_api, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi_pagination import add_pagination
+    from app.api import routes
+    from app.api.routes import router
+    from app.services.metrics import MetricsMiddleware
+
+    page_json = routes._page_json
+
+    def slow_page_json(*args):
+        time.sleep(0.05)
+        return page_json(*args)
+    monkeypatch.setattr(routes, "_page_json", slow_page_json)
+
+    timed_app = FastAPI()
+    timed_app.add_middleware(MetricsMiddleware, server_timing=True)
+    timed_app.include_router(router)
+    add_pagination(timed_app)
+    timed_app.state = app.state
+
+    response = TestClient(timed_app).get("/octocat")
+    assert response.status_code == 200
+    stages = {
+        name.strip(): float(duration.removeprefix("dur="))
+        for name, duration in (part.split(";") for part in response.headers["Server-Timing"].split(","))
+    }
+    assert {"validation", "upstream", "parse", "endpoint", "serialize", "total"} <= stages.keys()
+    # Rendering the page body counts as serialize, not endpoint
+    assert stages["serialize"] >= 50
+    assert stages["endpoint"] < 50
+    assert "server-timing" not in client.get("/octocat").headers
@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import metrics
+from app.services.metrics import Counter, Gauge, Histogram, InstrumentedTransport, Registry, Timings
+
+
+def test_counter_and_gauge_render_prometheus_text():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests served.", ("route",)))
+    in_flight = registry.register(Gauge("in_flight", "Requests in flight."))
+    requests.labels("/{username}").inc()
+    requests.labels("/{username}").inc(2)
+    requests.labels('say "hi"').inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/{username}"} 3' in text
+    assert 'requests_total{route="say \\"hi\\""} 1' in text
+    assert "in_flight 0" in text
+    assert text.endswith("\n")
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    lines = histogram.render().splitlines()
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_count 4" in lines
+    assert "latency_seconds_sum 3.65" in lines
+
+
+def test_label_count_is_checked():
+    with pytest.raises(ValueError):
+        Counter("c", "c", ("a", "b")).labels("only-one")
+
+
+@pytest.mark.anyio
+async def test_instrumented_transport_records_status_and_timeouts():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/slow":
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(404)
+
+    timings = Timings()
+    token = metrics.request_timings.set(timings)
+    async with httpx.AsyncClient(transport=InstrumentedTransport(httpx.MockTransport(handler))) as client:
+        await client.get("http://github.test/missing")
+        with pytest.raises(httpx.ReadTimeout):
+            await client.get("http://github.test/slow")
+    metrics.request_timings.reset(token)
+
+    text = metrics.GITHUB_REQUEST_DURATION.render()
+    assert 'github_request_duration_seconds_count{status="404"}' in text
+    assert 'github_request_duration_seconds_count{status="timeout"}' in text
+    assert metrics.GITHUB_IN_FLIGHT.labels().value == 0
+    assert "upstream" in timings.durations
+
+
+@pytest.mark.anyio
+async def test_event_loop_lag_monitor_records_blocking():
+    before = metrics.EVENT_LOOP_LAG.labels().count
+    monitor = asyncio.create_task(metrics.monitor_event_loop_lag(0.01))
+    await asyncio.sleep(0.05)
+    monitor.cancel()
+    assert metrics.EVENT_LOOP_LAG.labels().count > before
@@ -0,0 +1,83 @@
+import httpx
+import pytest
+
+from app.services.ratelimit import RateLimitExhausted, TokenPool
+
+
+def rate_headers(remaining: int, reset: float, limit: int = 5000) -> dict[str, str]:
+    return {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset": str(int(reset))}
+
+
+def test_acquire_prefers_token_with_most_remaining(clock):
+    pool = TokenPool(["a", "b"], clock=clock)
+    a, b = pool.budgets
+    pool.update(a, httpx.Response(200, headers=rate_headers(100, 2000)))
+    pool.update(b, httpx.Response(200, headers=rate_headers(3000, 2000)))
+
+    assert pool.acquire() is b
+    assert b.remaining == 2999
+
+
+def test_unknown_budget_is_tried_before_known_ones(clock):
+    pool = TokenPool(["a", "b"], clock=clock)
+    pool.update(pool.budgets[0], httpx.Response(200, headers=rate_headers(4000, 2000)))
+    assert pool.acquire().token == "b"
+
+
+def test_exhausted_pool_raises_with_retry_after(clock):
+    pool = TokenPool(["a", "b"], reserve=2, clock=clock)
+    a, b = pool.budgets
+    pool.update(a, httpx.Response(200, headers=rate_headers(2, 1030)))
+    pool.update(b, httpx.Response(403, headers=rate_headers(0, 1090)))
+
+    with pytest.raises(RateLimitExhausted) as exc_info:
+        pool.acquire()
+    assert exc_info.value.retry_after == 30
+    assert pool.rejected == 1
+
+
+def test_budget_restored_after_reset(clock):
+    pool = TokenPool(["a"], clock=clock)
+    pool.update(pool.budgets[0], httpx.Response(200, headers=rate_headers(0, 1060, limit=60)))
+    with pytest.raises(RateLimitExhausted):
+        pool.acquire()
+
+    clock.now = 1061
+    assert pool.acquire().remaining == 59
+
+
+def test_not_modified_without_headers_is_refunded(clock):
+    pool = TokenPool(["a"], clock=clock)
+    budget = pool.budgets[0]
+    pool.update(budget, httpx.Response(200, headers=rate_headers(10, 2000)))
+    pool.acquire()
+    pool.update(budget, httpx.Response(304))
+    assert budget.remaining == 10
+
+
+def test_anonymous_pool_when_no_tokens():
+    pool = TokenPool([])
+    budget = pool.acquire()
+    assert budget.token is None
+    assert pool.stats()["tokens"][0]["token"] == "anonymous"
+
+
+def test_pool_limit_is_known_once_every_token_answered(clock):
+    pool = TokenPool(["a", "b"], clock=clock)
+    a, b = pool.budgets
+    pool.update(a, httpx.Response(200, headers=rate_headers(10, 2000, limit=60)))
+    assert pool.limit() == float("inf")
+    pool.update(b, httpx.Response(200, headers=rate_headers(10, 2000, limit=5000)))
+    assert pool.limit() == 5060
+
+
+def test_available_budget_across_pool(clock):
+    pool = TokenPool(["a", "b"], reserve=10, clock=clock)
+    assert pool.available() == float("inf")
+    a, b = pool.budgets
+    pool.update(a, httpx.Response(200, headers=rate_headers(100, 2000)))
+    assert pool.available() == float("inf")
+    pool.update(b, httpx.Response(200, headers=rate_headers(5, 3000)))
+    assert pool.available() == 90
+    clock.now = 2000
+    assert pool.available() == 4990
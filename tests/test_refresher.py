@@ -0,0 +1,147 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import metrics
+from app.services.cache import CacheState, TTLCache
+from app.services.popularity import DecayedCounter
+from app.services.ratelimit import TokenPool
+from app.services.refresher import RefreshScheduler
+
+
+def test_decayed_counter_ranks_recent_popularity(clock):
+    counter = DecayedCounter(half_life=10, clock=clock)
+    for _ in range(8):
+        counter.hit("old")
+    clock.now += 30
+    for _ in range(2):
+        counter.hit("new")
+
+    assert counter.score("old") == pytest.approx(1.0)
+    assert counter.score("new") == pytest.approx(2.0)
+    assert [key for key, _ in counter.top(2)] == ["new", "old"]
+    assert counter.top(5, min_score=1.5) == [("new", pytest.approx(2.0))]
+
+
+def test_decayed_counter_rescales_and_stays_bounded(clock):
+    counter = DecayedCounter(half_life=1, max_keys=100, clock=clock)
+    counter.hit("a")
+    clock.now += 1000
+    counter.hit("b")
+    assert counter.score("b") == pytest.approx(1.0)
+    assert "a" not in dict(counter.top(10))
+
+    for i in range(150):
+        counter.hit(f"user{i}", amount=i + 1)
+    assert len(counter) <= 100
+    assert counter.top(1)[0][0] == "user149"
+
+
+def gists_handler(request: httpx.Request) -> httpx.Response:
+    gist = {"id": "1", "html_url": "https://gist.github.com/1", "description": None}
+    return httpx.Response(200, json=[gist], headers={"ETag": '"v1"'})
+
+
+@pytest.mark.anyio
+async def test_seed_users_are_loaded_on_first_pass(github_service):
+    service = github_service(gists_handler)
+    calls = github_service.calls
+    scheduler = RefreshScheduler(service, TokenPool([None]), interval=0, seed=["octocat", "Hubot"])
+    await scheduler.run_once()
+    assert sorted(call.url.path for call in calls) == ["/users/hubot/gists", "/users/octocat/gists"]
+    assert service.cache.peek(service.page_key("hubot", 1)).state is CacheState.FRESH
+    # Nothing is due yet, so the next pass does not call GitHub
+    await scheduler.run_once()
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_hot_users_refreshed_before_expiry_with_conditional_requests(github_service, clock):
+    service = github_service(gists_handler, TTLCache(ttl=30, clock=clock))
+    calls = github_service.calls
+    for _ in range(3):
+        await service.get_window("octocat", 0, 10)
+    await service.get_window("ghost", 0, 10)
+    scheduler = RefreshScheduler(service, TokenPool([None]), top_k=1, interval=0.01)
+
+    await scheduler.run_once()
+    assert len(calls) == 2
+    # Within the lead time (two intervals) of expiry
+    clock.now += 29.99
+    refreshed = metrics.GIST_REFRESH_AHEAD.labels("refreshed").value
+    await scheduler.run_once()
+
+    # Only the top-1 user was refreshed, with the cached validator
+    assert [call.url.path for call in calls[2:]] == ["/users/octocat/gists"]
+    assert calls[2].headers["If-None-Match"] == '"v1"'
+    assert service.cache.peek(service.page_key("octocat", 1)).age == 0
+    assert service.cache.peek(service.page_key("ghost", 1)).age == pytest.approx(29.99)
+    assert metrics.GIST_REFRESH_AHEAD.labels("refreshed").value == refreshed + 1
+
+
+@pytest.mark.anyio
+async def test_refresh_paused_when_rate_limit_budget_is_low(github_service):
+    service = github_service(gists_handler)
+    calls = github_service.calls
+    pool = TokenPool([None])
+    budget = pool.budgets[0]
+    budget.limit, budget.remaining, budget.reset_at = 5000, 100, 4102444800
+    scheduler = RefreshScheduler(service, pool, interval=0, seed=["octocat"], min_budget=500)
+    skipped = metrics.GIST_REFRESH_AHEAD.labels("skipped_budget").value
+    await scheduler.run_once()
+    assert calls == []
+    assert metrics.GIST_REFRESH_AHEAD.labels("skipped_budget").value == skipped + 1
+
+
+@pytest.mark.anyio
+async def test_small_rate_limit_keeps_half_for_refreshes(github_service):
+    service = github_service(gists_handler)
+    pool = TokenPool([None])
+    budget = pool.budgets[0]
+    # Anonymous GitHub limit: the default floor of 500 could never be met
+    budget.limit, budget.remaining, budget.reset_at = 60, 54, 4102444800
+    scheduler = RefreshScheduler(service, pool, interval=0, seed=["octocat"], min_budget=500)
+    assert scheduler.budget_floor == 30
+    await scheduler.run_once()
+    assert len(github_service.calls) == 1
+    budget.remaining = 29
+    service.popularity.hit("hubot")
+    await scheduler.run_once()
+    assert len(github_service.calls) == 1
+
+
+@pytest.mark.anyio
+async def test_failed_refresh_does_not_stop_the_pass(github_service):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if "missing" in request.url.path:
+            return httpx.Response(404, json={})
+        return gists_handler(request)
+
+    service = github_service(handler)
+    calls = github_service.calls
+    scheduler = RefreshScheduler(service, TokenPool([None]), interval=0, seed=["missing", "octocat"])
+    await scheduler.run_once()
+    assert len(calls) == 2
+    assert service.cache.peek(service.page_key("octocat", 1)).state is CacheState.FRESH
+    # The missing user is dropped from the ranking, so later passes skip it
+    assert [username for username, _ in service.popularity.top(10)] == ["octocat"]
+
+
+@pytest.mark.anyio
+async def test_run_survives_unexpected_errors(github_service, monkeypatch):
+    service = github_service(gists_handler)
+    scheduler = RefreshScheduler(service, TokenPool([None]), interval=0)
+    passes = 0
+
+    async def run_once() -> None:
+        nonlocal passes
+        passes += 1
+        if passes == 3:
+            raise asyncio.CancelledError
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(scheduler, "run_once", run_once)
+    with pytest.raises(asyncio.CancelledError):
+        await scheduler.run()
+    assert passes == 3
@@ -0,0 +1,191 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.config import Settings
+from app.services import metrics
+from app.services.cache import TTLCache
+from app.services.gists import GistService
+from app.services.github import create_http_client
+from app.services.resilience import CircuitBreaker, CircuitOpen, CircuitState, ResilientTransport, RetryBudget
+from benchmarks.fake_github import FakeGitHubConfig, create_app
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.failures == 0
+
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+    with pytest.raises(CircuitOpen) as exc:
+        breaker.before_call()
+    assert exc.value.retry_after == 30
+    assert breaker.rejected == 1
+
+
+def test_breaker_half_open_probe(clock):
+    transitions = metrics.GITHUB_CIRCUIT_TRANSITIONS.labels("open", "half_open").value
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.before_call()
+    breaker.record_failure()
+
+    clock.now += 30
+    breaker.before_call()
+    assert breaker.state is CircuitState.HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+    assert breaker.retry_after() == 30
+
+    clock.now += 30
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state is CircuitState.CLOSED
+    assert metrics.GITHUB_CIRCUIT_TRANSITIONS.labels("open", "half_open").value == transitions + 2
+    assert metrics.GITHUB_CIRCUIT_STATE.labels().value == 0
+
+
+def test_retry_budget_caps_retries():
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def stub(*answers):
+    """
+    Transport answering with `answers` in order: status codes, or exceptions to raise.
+    """
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        answer = answers[min(len(calls), len(answers) - 1)]
+        calls.append(request)
+        if isinstance(answer, type) and issubclass(answer, Exception):
+            raise answer("injected", request=request)
+        return httpx.Response(answer)
+
+    transport = httpx.MockTransport(handler)
+    transport.calls = calls
+    return transport
+
+
+async def send(transport: httpx.AsyncBaseTransport, method: str = "GET") -> httpx.Response:
+    async with httpx.AsyncClient(transport=transport, base_url="http://github.test") as client:
+        return await client.request(method, "/users/octocat/gists")
+
+
+@pytest.mark.anyio
+async def test_retries_idempotent_failures():
+    inner = stub(503, httpx.ConnectError, 200)
+    response = await send(ResilientTransport(inner, backoff=0))
+    assert response.status_code == 200
+    assert len(inner.calls) == 3
+
+    inner = stub(502)
+    response = await send(ResilientTransport(inner, retries=2, backoff=0))
+    assert response.status_code == 502
+    assert len(inner.calls) == 3
+
+
+@pytest.mark.anyio
+async def test_does_not_retry_final_answers_timeouts_or_writes():
+    for answer in (404, 403, httpx.ReadTimeout):
+        inner = stub(answer, 200)
+        transport = ResilientTransport(inner, backoff=0)
+        if isinstance(answer, int):
+            assert (await send(transport)).status_code == answer
+        else:
+            with pytest.raises(answer):
+                await send(transport)
+        assert len(inner.calls) == 1
+
+    inner = stub(503, 200)
+    assert (await send(ResilientTransport(inner, backoff=0), "POST")).status_code == 503
+    assert len(inner.calls) == 1
+
+
+@pytest.mark.anyio
+async def test_retry_budget_limits_retries_across_requests():
+    inner = stub(503)
+    transport = ResilientTransport(
+        inner, breaker=CircuitBreaker(failure_threshold=100), budget=RetryBudget(ratio=0.1, max_tokens=2), backoff=0
+    )
+    for _ in range(3):
+        await send(transport)
+    # 3 requests, but only the 2 banked retries (plus 0.3 deposited) were spent
+    assert len(inner.calls) == 5
+
+
+@pytest.mark.anyio
+async def test_open_circuit_fails_fast_without_calling_upstream():
+    inner = stub(httpx.ConnectError)
+    transport = ResilientTransport(inner, breaker=CircuitBreaker(failure_threshold=3), retries=0)
+    for _ in range(3):
+        with pytest.raises(httpx.ConnectError):
+            await send(transport)
+    with pytest.raises(CircuitOpen):
+        await send(transport)
+    assert len(inner.calls) == 3
+
+
+@pytest.mark.anyio
+async def test_hedges_calls_slower_than_recent_p95():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        # The 21st call (first after the latency window warms up) stalls; its hedge does not
+        if len(calls) == 21:
+            await asyncio.sleep(5)
+        else:
+            await asyncio.sleep(0.005)
+        return httpx.Response(200, text=str(len(calls)))
+
+    transport = ResilientTransport(httpx.MockTransport(handler), hedge=True)
+    for _ in range(20):
+        await send(transport)
+    won = metrics.GITHUB_HEDGES.labels("hedge").value
+
+    started = time.perf_counter()
+    response = await send(transport)
+    assert time.perf_counter() - started < 1
+    assert response.text == "22"
+    assert metrics.GITHUB_HEDGES.labels("hedge").value == won + 1
+    assert transport.breaker.state is CircuitState.CLOSED
+
+
+@pytest.mark.anyio
+async def test_circuit_breaker_against_failing_fake_github():
+    fake = create_app(FakeGitHubConfig(error_rate=1.0, error_status=503))
+    settings = Settings(github_token=None, retries=0, breaker_failures=3)
+    client = create_http_client(settings, transport=httpx.ASGITransport(app=fake))
+    service = GistService(client, TTLCache(ttl=60))
+    statuses = []
+    for username in ("a", "b", "c", "d", "e"):
+        with pytest.raises(HTTPException) as exc:
+            await service.get_window(username, 0, 10)
+        statuses.append(exc.value.status_code)
+    assert statuses == [503, 503, 503, 503, 503]
+    assert exc.value.detail == "GitHub API is unavailable. Please try again later."
+    await client.aclose()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake), base_url="http://fake") as stats:
+        assert (await stats.get("/_stats")).json() == {"requests": 3, "errors": 3}
+
@@ -0,0 +1,92 @@
+from app.schemas.gists import Gist, GistFile
+from app.services.search import GistIndex, tokenize
+
+
+def gist(id: str, description: str | None = None, files: dict[str, str | None] | None = None,
+         public: bool = True, created: str | None = None, updated: str | None = None) -> Gist:
+    return Gist(
+        id=id,
+        html_url=f"https://gist.github.com/u/{id}",
+        description=description,
+        public=public,
+        created_at=created,
+        updated_at=updated,
+        files={name: GistFile(language=language) for name, language in (files or {}).items()},
+    )
+
+
+def ids(gists: list[Gist]) -> list[str]:
+    return [g.id for g in gists]
+
+
+def test_tokenize_splits_words_and_filenames():
+    assert tokenize("Hello_world.py — Ünïcode, 2024!") == {"hello", "world", "py", "ünïcode", "2024"}
+    assert tokenize(None) == set()
+
+
+def test_query_intersects_words_language_and_visibility():
+    index = GistIndex()
+    index.update(1, [
+        gist("a", "Docker compose example", {"docker-compose.yml": "YAML"}),
+        gist("b", "python docker helper", {"build.py": "Python"}, public=False),
+        gist("c", None, {"notes.md": "Markdown", "helper.py": "Python"}),
+    ])
+    assert ids(index.query(q="docker")) == ["a", "b"]
+    assert ids(index.query(q="DOCKER helper")) == ["b"]
+    assert ids(index.query(q="helper")) == ["b", "c"]
+    assert ids(index.query(language="python")) == ["b", "c"]
+    assert ids(index.query(language="python", public=True)) == ["c"]
+    assert ids(index.query(public=False)) == ["b"]
+    assert ids(index.query(q="compose", language="python")) == []
+    assert ids(index.query(q="missing")) == []
+    # Punctuation only: no words to match, rather than matching everything
+    assert ids(index.query(q="--")) == []
+
+
+def test_sort_newest_first_with_and_without_filters():
+    gists = [
+        gist(f"g{i}", "gist", created=f"2024-01-{i + 1:02d}", updated=f"2024-02-{28 - i:02d}")
+        for i in range(20)
+    ]
+    index = GistIndex()
+    index.update(1, gists)
+    assert ids(index.query(sort="created"))[:3] == ["g19", "g18", "g17"]
+    assert ids(index.query(sort="updated"))[:3] == ["g0", "g1", "g2"]
+    # Few matches are sorted directly, many are found by scanning the date order
+    index.update(2, [gist("g20", "rare", created="2023-01-01"), gist("g21", "rare", created="2025-01-01")])
+    assert ids(index.query(q="rare", sort="created")) == ["g21", "g20"]
+    assert ids(index.query(q="gist", sort="created")) == [f"g{i}" for i in range(19, -1, -1)]
+
+
+def test_unchanged_page_versions_are_not_reindexed():
+    index = GistIndex()
+    assert index.update(1, [gist("a", "one")], version='"v1"')
+    assert not index.update(1, [gist("a", "changed")], version='"v1"')
+    assert ids(index.query(q="one")) == ["a"]
+    assert index.update(1, [gist("a", "changed")], version='"v2"')
+    assert ids(index.query(q="one")) == []
+    assert ids(index.query(q="changed")) == ["a"]
+
+
+def test_gist_moving_between_pages_is_indexed_once():
+    index = GistIndex()
+    index.update(1, [gist("a", created="1"), gist("b", created="2")], version="p1")
+    index.update(2, [gist("c", created="3")], version="p2")
+    # "c" was updated, so GitHub now lists it first and "b" slides to page 2
+    index.update(1, [gist("c", "edited", created="3"), gist("a", created="1")], version="p1b")
+    # "b" is back once page 2 is re-indexed; "c" is not listed twice meanwhile
+    assert ids(index.query()) == ["c", "a"]
+    index.update(2, [gist("b", created="2")], version="p2b")
+    assert ids(index.query()) == ["c", "a", "b"]
+    assert ids(index.query(sort="created")) == ["c", "b", "a"]
+    assert ids(index.query(q="edited")) == ["c"]
+
+
+def test_truncate_drops_pages_past_the_end():
+    index = GistIndex()
+    index.update(1, [gist("a", "x")])
+    index.update(2, [gist("b", "x")])
+    index.truncate(1)
+    assert ids(index.query(q="x")) == ["a"]
+    assert ids(index.query(sort="updated")) == ["a"]
+    assert len(index) == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+@pytest.mark.anyio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        await release.wait()
+        return object()
+
+    waiters = [asyncio.create_task(flight.do("octocat", work)) for _ in range(10)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert runs == 1
+    assert all(r is results[0] for r in results)
+    assert (flight.executions, flight.coalesced) == (1, 9)
+    assert len(flight) == 0
+
+
+@pytest.mark.anyio
+async def test_error_is_shared_by_all_waiters():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fail():
+        await release.wait()
+        raise ValueError("upstream down")
+
+    waiters = [asyncio.create_task(flight.do("octocat", fail)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.executions == 1
+
+
+@pytest.mark.anyio
+async def test_cancelling_leader_does_not_fail_followers():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "gists"
+
+    leader = asyncio.create_task(flight.do("octocat", work))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("octocat", work))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await follower == "gists"
+    assert leader.cancelled()
+
+
+@pytest.mark.anyio
+async def test_gist_service_coalesces_concurrent_misses(github_service):
+    calls = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=[{"id": "1", "html_url": "https://gist.github.com/1", "description": None}])
+
+    service = github_service(handler)
+    results = await asyncio.gather(*(service.get_page("octocat") for _ in range(20)))
+
+    assert calls == 1
+    assert all(r is results[0] for r in results)
+    assert service.stats()["upstream_coalesced"] == 19
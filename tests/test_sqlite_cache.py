@@ -0,0 +1,282 @@
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import multiprocessing
+import sqlite3
+import sys
+
+import httpx
+
+import pytest
+
+from app.config import Settings
+from app.schemas.gists import Gist, GistFile
+from app.services.cache import CacheState, TTLCache
+from app.services.gists import CachedGists, create_gist_cache
+from app.services.sqlite_cache import SQLiteCache
+
+
+def make_entry(n: int, prefix: str = "g") -> CachedGists:
+    gists = [
+        Gist(
+            id=f"{prefix}{i}",
+            html_url=f"https://gist.github.com/u/{prefix}{i}",
+            description=None if i % 2 else f"gist {i} ✓",
+            public=i % 3 != 0,
+            created_at=f"2024-01-{i % 28 + 1:02d}T00:00:00Z",
+            updated_at=None if i % 4 == 1 else f"2024-02-{i % 28 + 1:02d}T00:00:00Z",
+            files={f"file{j}.py": GistFile(language=None if j else "Python") for j in range(i % 3)},
+        )
+        for i in range(n)
+    ]
+    return CachedGists(gists, etag='W/"abc"', last_modified=None, last_page=7, has_next=True)
+
+
+def open_cache(path, **kwargs) -> SQLiteCache[CachedGists]:
+    kwargs.setdefault("ttl", 60)
+    return SQLiteCache(str(path), CachedGists.to_bytes, CachedGists.from_bytes, **kwargs)
+
+
+def test_codec_roundtrip():
+    entry = make_entry(5)
+    decoded = CachedGists.from_bytes(entry.to_bytes())
+    assert decoded == entry
+    assert CachedGists.from_bytes(CachedGists([]).to_bytes()) == CachedGists([])
+
+
+def test_codec_rejects_truncated_data():
+    data = make_entry(3).to_bytes()
+    with pytest.raises(Exception):
+        CachedGists.from_bytes(data[:-4])
+
+
+def test_codec_is_smaller_than_json():
+    entry = make_entry(100)
+    as_json = b"".join(g.model_dump_json().encode() for g in entry.gists)
+    assert len(entry.to_bytes()) < len(as_json)
+
+
+def test_fresh_stale_expired(tmp_path, clock):
+    cache = open_cache(tmp_path / "cache.db", ttl=10, stale_ttl=5, clock=clock)
+    cache.set(("octocat", 1), make_entry(2), size=0)
+
+    assert cache.get(("octocat", 1)).state is CacheState.FRESH
+    clock.now += 12
+    assert cache.get(("octocat", 1)).state is CacheState.STALE
+    clock.now += 5
+    lookup = cache.get(("octocat", 1))
+    assert lookup.state is CacheState.EXPIRED
+    assert lookup.value == make_entry(2)
+    assert cache.get(("octocat", 2)).state is CacheState.MISS
+
+
+def test_peek_reports_age_without_counting(tmp_path, clock):
+    cache = open_cache(tmp_path / "cache.db", ttl=10, stale_ttl=5, clock=clock)
+    cache.set(("octocat", 1), make_entry(2), size=0)
+    clock.now += 3
+    lookup = cache.peek(("octocat", 1))
+    assert (lookup.state, lookup.age, lookup.value) == (CacheState.FRESH, 3, make_entry(2))
+    assert cache.peek(("octocat", 2)).state is CacheState.MISS
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+
+def test_survives_reopen(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = open_cache(path)
+    cache.set(("octocat", 1), make_entry(3), size=0)
+    cache.close()
+
+    reopened = open_cache(path)
+    lookup = reopened.get(("octocat", 1))
+    assert lookup.state is CacheState.FRESH
+    assert lookup.value == make_entry(3)
+
+
+def test_lru_eviction_by_entries_and_bytes(tmp_path, clock):
+    cache = open_cache(tmp_path / "cache.db", max_entries=2, clock=clock)
+    cache.set("a", make_entry(1), size=0)
+    clock.now += 2
+    cache.set("b", make_entry(1), size=0)
+    clock.now += 2
+    cache.get("a")
+    clock.now += 2
+    cache.set("c", make_entry(1), size=0)
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+    one = len(make_entry(10).to_bytes())
+    small = open_cache(tmp_path / "small.db", max_bytes=one * 2 + 1, clock=clock)
+    for key in ("x", "y", "z"):
+        clock.now += 2
+        small.set(key, make_entry(10), size=0)
+    assert len(small) == 2
+    assert "x" not in small
+    assert small.stats()["bytes"] == one * 2
+
+
+def test_undecodable_entry_is_a_miss(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), lambda v: v, CachedGists.from_bytes, ttl=60)
+    cache.set("octocat", b"\x09garbage", size=0)
+    assert cache.get("octocat").state is CacheState.MISS
+    # Reads never write; the next set() replaces it
+    cache.set("octocat", make_entry(1).to_bytes(), size=0)
+    assert cache.get("octocat").state is CacheState.FRESH
+
+
+def test_reads_do_not_write_and_writes_skip_when_locked(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    cache = open_cache(path, clock=clock, busy_timeout=0.05)
+    cache.set("a", make_entry(3), size=0)
+    other = sqlite3.connect(path, isolation_level=None)
+    # Another worker holds the write lock
+    other.execute("BEGIN IMMEDIATE")
+    clock.now += 5
+    assert cache.get("a").state is CacheState.FRESH
+    cache.set("b", make_entry(3), size=0)
+    assert "b" not in cache
+    assert cache.stats()["errors"] == 1
+    other.execute("ROLLBACK")
+    # The deferred LRU timestamp of "a" is written with the next write
+    cache.set("b", make_entry(3), size=0)
+    assert other.execute("SELECT accessed_at FROM entries WHERE key = 'a'").fetchone() == (clock.now,)
+    other.close()
+
+
+def test_concurrent_threads_share_one_cache(tmp_path):
+    ticks = itertools.count()
+    # Every call sees a later time, so every read leaves an LRU timestamp to write
+    cache = open_cache(tmp_path / "cache.db", ttl=1e9, clock=lambda: 2.0 * next(ticks))
+    keys = 200
+    for i in range(keys):
+        cache.set(("user", i), make_entry(2), size=0)
+    rounds, workers = 400, 8
+
+    def work(worker: int) -> None:
+        for i in range(rounds):
+            cache.get(("user", (i * 7 + worker) % keys))
+            if i % 5 == 0:
+                cache.set(("user", (i * worker) % keys), make_entry(2), size=0)
+
+    # Switch threads as often as possible, to interleave reads with flushes
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            # result() re-raises anything a worker hit
+            for future in [pool.submit(work, worker) for worker in range(workers)]:
+                future.result()
+    finally:
+        sys.setswitchinterval(interval)
+    stats = cache.stats()
+    assert stats["hits"] == rounds * workers
+    assert stats["errors"] == 0
+    cache.close()
+
+
+def test_database_errors_are_misses(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = open_cache(path)
+    cache.set("a", make_entry(3), size=0)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("DROP TABLE entries")
+    other.close()
+    assert cache.get("a").state is CacheState.MISS
+    assert cache.peek("a").state is CacheState.MISS
+    cache.set("a", make_entry(3), size=0)
+    stats = cache.stats()
+    assert stats["errors"] == 3
+    assert "entries" in stats
+
+
+def _writer(path: str, worker: int, rounds: int) -> None:
+    cache = open_cache(path, max_entries=50)
+    for i in range(rounds):
+        cache.set(("user", i % 10), make_entry(20 + worker, prefix=f"w{worker}-"), size=0)
+        lookup = cache.get(("user", (i + 3) % 10))
+        if lookup.value is not None:
+            # Every value read must be one complete entry written by some worker
+            prefix = lookup.value.gists[0].id.split("-")[0]
+            assert len(lookup.value.gists) == 20 + int(prefix[1:])
+    cache.close()
+
+
+def test_concurrent_processes_never_see_torn_entries(tmp_path):
+    path = str(tmp_path / "shared.db")
+    open_cache(path).close()
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_writer, args=(path, w, 200)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(30)
+    assert [p.exitcode for p in workers] == [0, 0, 0, 0]
+
+    cache = open_cache(path)
+    assert len(cache) == 10
+    assert cache.stats()["bytes"] == sum(
+        len(cache.get(("user", i)).value.to_bytes()) for i in range(10)
+    )
+
+
+def test_create_gist_cache_selects_backend(tmp_path):
+    assert isinstance(create_gist_cache(Settings(cache_backend="memory")), TTLCache)
+    cache = create_gist_cache(Settings(cache_backend="sqlite", cache_path=str(tmp_path / "c.db")))
+    assert isinstance(cache, SQLiteCache)
+    cache.close()
+    with pytest.raises(ValueError):
+        create_gist_cache(Settings(cache_backend="redis"))
+
+
+@pytest.mark.anyio
+async def test_workers_share_fetched_pages(github_service, tmp_path):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=[{"id": "1", "html_url": "https://gist.github.com/1", "description": None}])
+
+    settings = Settings(github_token=None, cache_backend="sqlite", cache_path=str(tmp_path / "shared.db"))
+    first_worker = github_service(handler, create_gist_cache(settings), settings)
+    second_worker = github_service(handler, create_gist_cache(settings), settings)
+
+    await first_worker.get_window("octocat", 0, 50)
+    items, total = await second_worker.get_window("octocat", 0, 50)
+
+    assert [g.id for g in items] == ["1"]
+    assert total == 1
+    assert len(github_service.calls) == 1
+
+
+@pytest.mark.anyio
+async def test_locked_cache_still_serves_requests(github_service, tmp_path):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=[{"id": "1", "html_url": "https://gist.github.com/1", "description": None}])
+
+    settings = Settings(github_token=None, cache_backend="sqlite", cache_path=str(tmp_path / "locked.db"))
+    service = github_service(handler, create_gist_cache(settings), settings)
+    other = sqlite3.connect(settings.cache_path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    items, total = await service.get_window("octocat", 0, 50)
+
+    assert [g.id for g in items] == ["1"]
+    assert service.stats()["errors"] >= 1
+    other.execute("ROLLBACK")
+    other.close()
+
+
+@pytest.mark.anyio
+async def test_pages_cached_at_another_page_size_are_not_reused(github_service, tmp_path):
+    def handler(request: httpx.Request) -> httpx.Response:
+        per_page = int(request.url.params["per_page"])
+        gists = [{"id": str(i), "html_url": f"https://gist.github.com/{i}", "description": None} for i in range(per_page)]
+        return httpx.Response(200, json=gists)
+
+    settings = Settings(github_token=None, cache_backend="sqlite", cache_path=str(tmp_path / "shared.db"))
+    before = github_service(handler, create_gist_cache(settings), settings)
+    before.per_page = 5
+    await before.get_page("octocat", 2)
+    # Restarted with another GITHUB_PER_PAGE over the same database
+    after = github_service(handler, create_gist_cache(settings), settings)
+    after.per_page = 10
+
+    assert len((await after.get_page("octocat", 2)).gists) == 10
+    assert len(github_service.calls) == 2